@@ -0,0 +1,110 @@
+""" Compare ieuler.parsing (lxml, compiled XPath) with the requests_html element path it replaced.
+
+    python benchmarks/parsing.py [-number 200] [-json results.json]
+
+Both parse the pages in tests/fixtures from their raw bytes, as a warm-cache fetch does, and must agree.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ieuler import parsing  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'fixtures')
+URL = 'https://projecteuler.net/archives;page=2'
+
+
+# what Client used to do, through requests_html's element wrappers
+def legacy_archive_page(content: bytes, url: str):
+    from requests_html import HTML
+
+    html = HTML(html=content, url=url)
+    data = []
+    column_headers = []
+    for i, tr in enumerate(html.find('tr')):
+        if not tr.find('.id_column'):
+            continue
+        row = {_: None for _ in column_headers}
+        if i == 0:
+            for th in tr.find('th'):
+                if th.text:
+                    column_headers.append(th.text)
+            continue
+        for j, td in enumerate(tr.find('td')):
+            if j < len(column_headers):
+                row[column_headers[j]] = td.text
+            else:
+                img = td.find('img', first=True)
+                if img:
+                    if img.attrs['title'] == 'Solved':
+                        row['Solved'] = True
+                        break
+                row['Solved'] = False
+                break
+        row.update({'problem_url': f'https://projecteuler.net/problem={row["ID"]}'})
+        row.update({'page_url': url})
+        row.update({'ID': int(row['ID'])})
+        data.append(row)
+    return data
+
+
+def legacy_page_qty(content: bytes):
+    from requests_html import HTML
+
+    for a in reversed(HTML(html=content).find('a')):
+        s = re.search(r'=([0-9]*)$', a.attrs['href'])
+        if s:
+            return int(s.group(1))
+    return 15
+
+
+def legacy_problem_page(content: bytes):
+    from requests_html import HTML
+
+    html = HTML(html=content)
+    return html.find('h2', first=True).text, html.find('.problem_content', first=True).html
+
+
+def read(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def run(number: int):
+    archives, problem = read('archives.html'), read('problem.html')
+    cases = [('archive page', lambda: legacy_archive_page(archives, URL),
+              lambda: parsing.parse_archive_page(archives, URL)),
+             ('page count', lambda: legacy_page_qty(archives), lambda: parsing.parse_page_qty(archives)),
+             ('problem page', lambda: legacy_problem_page(problem), lambda: parsing.parse_problem_page(problem))]
+    rows = []
+    for name, legacy, fast in cases:
+        assert legacy() == fast(), f'{name}: the parsers disagree'
+        legacy_s = min(timeit.repeat(legacy, number=number, repeat=3)) / number
+        fast_s = min(timeit.repeat(fast, number=number, repeat=3)) / number
+        rows.append({'name': name, 'requests_html_ms': legacy_s * 1000, 'lxml_ms': fast_s * 1000,
+                     'speedup': legacy_s / fast_s})
+    return rows
+
+
+def report(rows):
+    print(f'{"page":<14} {"requests_html ms":>16} {"lxml ms":>8} {"speedup":>8}')
+    for _ in rows:
+        print(f'{_["name"]:<14} {_["requests_html_ms"]:>16.3f} {_["lxml_ms"]:>8.3f} {_["speedup"]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-number', type=int, default=200, help='Parses per timing.')
+    parser.add_argument('-json', dest='json_filename', default=None, help='Also write the results to this file.')
+    args = parser.parse_args()
+
+    results = run(args.number)
+    report(results)
+    if args.json_filename:
+        with open(args.json_filename, 'wt') as f:
+            json.dump(results, f, sort_keys=True, indent=4)
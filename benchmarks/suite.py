@@ -0,0 +1,188 @@
+""" Benchmarks of the client's hot paths, offline, against the responses recorded in tests/fixtures.
+
+    python benchmarks/suite.py [-filter update_problems] [-repeat 5] [-number N] [-json results.json] [-compare old.json]
+
+Pages come from a warm response cache, the way a repeated fetch sees them.  Results are written as JSON (with the
+python and ieuler versions they were measured with) so two releases can be compared with -compare.
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ieuler.__version__ import __version__  # noqa: E402
+from ieuler.cli import ls_output, solution_template  # noqa: E402
+from ieuler.client import Captcha, Client  # noqa: E402
+from ieuler.language_templates import Template, get_template  # noqa: E402
+from ieuler.terminal_image_viewer import show_image  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'fixtures')
+STORE_SIZES = (100, 1000, 10000)
+
+
+def read(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+class RecordedSession(object):
+    """ Answers requests with the recorded responses, as projecteuler.net would. """
+
+    ROUTES = (('captcha/', 'captcha.png', 'image/png'),
+              ('sign_in', 'sign_in.html', 'text/html; charset=UTF-8'),
+              ('archives', 'archives.html', 'text/html; charset=UTF-8'),
+              ('problem=', 'problem.html', 'text/html; charset=UTF-8'))
+
+    def __init__(self):
+        import requests
+
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.cookies.set('PHPSESSID', 'recorded')
+        self.responses = {_[0]: read(_[1]) for _ in self.ROUTES}
+
+    def response(self, url: str, content: bytes, content_type: str):
+        import requests
+        import requests_html
+
+        r = requests.Response()
+        r._content = content
+        r.status_code = 200
+        r.url = url
+        r.encoding = 'utf-8'
+        r.headers = requests.structures.CaseInsensitiveDict({'Content-Type': content_type})
+        return requests_html.HTMLResponse._from_response(r, self)
+
+    def get(self, url: str, headers=None, **kwargs):
+        for prefix, name, content_type in self.ROUTES:
+            if prefix in url:
+                return self.response(url, self.responses[prefix], content_type)
+        raise KeyError(f'nothing recorded for {url}')
+
+    def post(self, url: str, data=None, **kwargs):
+        return self.response('https://projecteuler.net/archives', self.responses['archives'], 'text/html')
+
+
+def synthetic_problems(n: int):
+    return [{'ID': i, 'Description / Title': f'Problem {i}', 'Solved By': str(10 ** 6 // i), 'Solved': i % 3 == 0,
+             'problem_url': f'https://projecteuler.net/problem={i}',
+             'page_url': f'https://projecteuler.net/archives;page={(i - 1) // 50 + 1}'}
+            for i in range(1, n + 1)]
+
+
+def make_client(dirname: str, problems=()) -> Client:
+    os.makedirs(dirname, exist_ok=True)
+    client = Client(**{f'{_}_filename': os.path.join(dirname, f'.{_}')
+                       for _ in ('cookies', 'credentials', 'problems', 'default_language', 'login_state',
+                                 'sync_state', 'search_index')},
+                    cache_dirname=os.path.join(dirname, '.cache'), storage='sqlite')
+    client._session = RecordedSession()
+    if problems:
+        client.store.upsert(list(problems))
+    return client
+
+
+def benchmarks(tmp: str):
+    """ (name, params, setup) for every benchmark, setup() makes what it needs and returns the function to time """
+    @functools.lru_cache(maxsize=None)
+    def client():
+        c = make_client(os.path.join(tmp, 'client'))
+        c.get_problem_list_on_page(2), c.get_problem_details(22)  # warm the response cache
+        return c
+
+    @functools.lru_cache(maxsize=None)
+    def store_client(size):
+        c = make_client(os.path.join(tmp, f'store-{size}'), synthetic_problems(size))
+        c.problems  # loaded up front, as a fetch has them
+        return c
+
+    yield 'get_problem_list_on_page', {}, lambda: lambda: client().get_problem_list_on_page(2)
+    yield 'get_page_qty', {}, lambda: client().get_page_qty
+    yield 'get_problem_details', {}, lambda: lambda: client().get_problem_details(22)
+    yield 'login', {}, lambda: lambda: client().login('euler', 'secret', captcha='40587')
+
+    captcha = read('captcha.png')
+    yield 'captcha decode', {}, lambda: lambda: Captcha(captcha).img.load()
+    for width in (80, 200):
+        yield 'show_image', {'width': width}, \
+            lambda width=width, image=Captcha(captcha).img: lambda: show_image(image, width=width, file=io.StringIO())
+
+    for size in STORE_SIZES:
+        page = [dict(_, **{'Solved By': str(int(_['Solved By']) + 1)}) for _ in synthetic_problems(size)[-50:]]
+        yield 'update_problems', {'store': size, 'rows': len(page)}, \
+            lambda size=size, page=page: functools.partial(store_client(size).update_problems, page)
+        yield 'update_problems', {'store': size, 'rows': size}, \
+            lambda size=size: functools.partial(store_client(size).update_problems, synthetic_problems(size))
+        yield 'ls_output', {'store': size}, \
+            lambda size=size: lambda problems=synthetic_problems(size): sum(1 for _ in ls_output(problems))
+        yield 'load_problems', {'store': size}, lambda size=size: store_client(size).load_problems
+
+    problem = dict(synthetic_problems(22)[-1], Problem=read('problem.html').decode())
+    for template in Template.__subclasses__():
+        language_template = get_template(template().language)
+        yield 'solution_template', {'language': language_template.language}, \
+            lambda t=language_template: functools.partial(solution_template, problem, t)
+
+
+def measure(func, repeat: int, number: int = None):
+    timer = timeit.Timer(func)
+    number = number or timer.autorange()[0]
+    times = [_ / number for _ in timer.repeat(repeat=repeat, number=number)]
+    return {'number': number, 'repeat': repeat, 'best_s': min(times), 'median_s': statistics.median(times),
+            'mean_s': statistics.mean(times), 'stdev_s': statistics.stdev(times) if len(times) > 1 else 0.0}
+
+
+def key(result) -> str:
+    params = ','.join(f'{k}={v}' for k, v in sorted(result['params'].items()))
+    return f'{result["name"]}({params})'
+
+
+def run(repeat: int, name_filter: str = None, number: int = None):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, params, setup in benchmarks(tmp):
+            if name_filter and name_filter not in name:
+                continue
+            results.append(dict(measure(setup(), repeat, number), name=name, params=params))
+            print(f'{key(results[-1]):<50} {results[-1]["best_s"] * 1000:>10.3f} ms', file=sys.stderr)
+    return {'meta': {'ieuler': __version__, 'python': platform.python_version(), 'platform': platform.platform(),
+                     'measured_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+            'results': results}
+
+
+def compare(old, new):
+    before = {key(_): _ for _ in old['results']}
+    print(f'{"benchmark":<50} {"before ms":>10} {"after ms":>10} {"change":>8}')
+    for _ in new['results']:
+        previous = before.get(key(_))
+        change = f'{_["best_s"] / previous["best_s"]:.2f}x' if previous else 'new'
+        old_ms = f'{previous["best_s"] * 1000:.3f}' if previous else ''
+        print(f'{key(_):<50} {old_ms:>10} {_["best_s"] * 1000:>10.3f} {change:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-filter', dest='name_filter', default=None, help='Only benchmarks whose name has this.')
+    parser.add_argument('-repeat', type=int, default=5, help='Timings of each benchmark (the best is reported).')
+    parser.add_argument('-number', type=int, default=None, help='Calls per timing (default: enough for 0.2 s).')
+    parser.add_argument('-json', dest='json_filename', default=None, help='Write the results here ("-" for stdout).')
+    parser.add_argument('-compare', dest='compare_filename', default=None, help='Earlier results to compare with.')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.name_filter, args.number)
+    if args.json_filename == '-':
+        print(json.dumps(results, sort_keys=True, indent=4))
+    elif args.json_filename:
+        with open(args.json_filename, 'wt') as f:
+            json.dump(results, f, sort_keys=True, indent=4)
+    if args.compare_filename:
+        with open(args.compare_filename, 'rt') as f:
+            compare(json.load(f), results)
@@ -0,0 +1,162 @@
+""" Load test `ilr send` and `ilr fetch` against the ieuler-server stand-in with synthetic stores.
+
+    python benchmarks/sync_load.py -problems 100,1000,5000 -changed 0.01 -repeat 5 [-json results.json]
+
+For every store size this times, through the real commands:
+
+- send (full): the first send of every solution
+- send (delta): a send after `-changed` of the solutions were edited
+- send (noop): a send with nothing changed
+- fetch (full): a second machine pulling everything
+- fetch (delta): that machine pulling only the edits
+
+and reports per request latency percentiles, bytes on the wire and problems per second.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from click.testing import CliRunner
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ieuler.cli import Session, ilr  # noqa: E402
+from ieuler.client import Client  # noqa: E402
+from ieuler.devserver import StandInServer  # noqa: E402
+
+USERNAME = 'euler'
+COOKIES = {'PHPSESSID': 'load-test'}
+
+
+def synthetic_problems(n: int, code_size: int):
+    body = ''.join(random.choice('abcdefghij \n') for _ in range(code_size))
+    return [{'ID': i, 'Description / Title': f'Problem {i}', 'Solved By': str(random.randint(100, 10 ** 6)),
+             'Solved': i % 3 == 0,
+             'code': {'python3': {'filename': f'{i}.py', 'filecontent': f'# {i}\n{body}', 'submission': None}}}
+            for i in range(1, n + 1)]
+
+
+def make_session(dirname: str, stand_in: StandInServer, problems) -> Session:
+    os.makedirs(dirname, exist_ok=True)
+    session = Session(**{f'{_}_filename': os.path.join(dirname, f'.{_}')
+                         for _ in ('cookies', 'credentials', 'problems', 'default_language', 'login_state',
+                                   'sync_state', 'search_index')},
+                      cache_dirname=os.path.join(dirname, '.cache'))
+    client = session.client
+    client.set_server_config(stand_in.host, stand_in.port)
+    client.dump_credentials({'username': USERNAME, 'password': ''})
+    client.dump_cookies(COOKIES)
+    # a trusted login, so no request goes to projecteuler.net
+    client.dump_login_state({'username': USERNAME, 'cookies': Client.get_cookie_jar_key(COOKIES),
+                             'verified_at': time.time(), 'expires': None})
+    client.store.upsert(problems)
+    return session
+
+
+def percentile(values, p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def measure(name: str, session: Session, stand_in: StandInServer, args, problem_qty: int, prepare=None,
+            repeat: int = 1):
+    latencies, walls, totals = [], [], {'requests': 0, 'bytes_in': 0, 'bytes_out': 0}
+    hook = lambda r, *_, **__: latencies.append(r.elapsed.total_seconds())  # noqa: E731
+    session.client.server_session.hooks['response'].append(hook)
+    try:
+        for _ in range(repeat):
+            if prepare:
+                prepare()
+            stand_in.reset_stats()
+            start = time.perf_counter()
+            result = CliRunner().invoke(ilr, args, obj=session, catch_exceptions=False)
+            walls.append(time.perf_counter() - start)
+            if result.exit_code:
+                raise RuntimeError(result.output)
+            for k in totals:
+                totals[k] += stand_in.stats[k]
+    finally:
+        session.client.server_session.hooks['response'].remove(hook)
+    wall = statistics.median(walls)
+    return {'name': name, 'problems': problem_qty, 'wall_s': wall, 'requests': totals['requests'] / repeat,
+            'p50_ms': _ms(percentile(latencies, 50)), 'p95_ms': _ms(percentile(latencies, 95)),
+            'p99_ms': _ms(percentile(latencies, 99)),
+            'bytes_in': totals['bytes_in'] // repeat, 'bytes_out': totals['bytes_out'] // repeat,
+            'problems_per_s': problem_qty / wall if wall else None}
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def run(sizes, changed: float, repeat: int, code_size: int):
+    rows = []
+    for size in sizes:
+        problems = synthetic_problems(size, code_size)
+        edits = max(1, int(size * changed))
+        with tempfile.TemporaryDirectory() as tmp, StandInServer() as stand_in:
+            here = make_session(os.path.join(tmp, 'here'), stand_in, problems)
+            there = make_session(os.path.join(tmp, 'there'), stand_in,
+                                 [{k: v for k, v in _.items() if k != 'code'} for _ in problems])
+
+            def reset_here():
+                here.client.sync_state().reset()
+
+            def edit():
+                for problem in random.sample(here.client.problems, edits):
+                    problem['code']['python3']['filecontent'] += f'# edit {random.random()}\n'
+                here.client.update_problems(here.client.problems)
+
+            def reset_there():
+                there.client.sync_state().reset()
+
+            rows.append(measure('send (full)', here, stand_in, ['send', '--silent'], size, reset_here, repeat))
+            rows.append(measure('send (delta)', here, stand_in, ['send', '--silent'], edits, edit, repeat))
+            rows.append(measure('send (noop)', here, stand_in, ['send', '--silent'], 0, None, repeat))
+            fetch = ['fetch', '--skip-pe-update']
+            rows.append(measure('fetch (full)', there, stand_in, fetch, size, reset_there, repeat))
+            rows.append(measure('fetch (delta)', there, stand_in, fetch, edits, edit_and_send(here, edit), repeat))
+    return rows
+
+
+def edit_and_send(session: Session, edit):
+    def prepare():
+        edit()
+        CliRunner().invoke(ilr, ['send', '--silent'], obj=session, catch_exceptions=False)
+    return prepare
+
+
+def report(rows):
+    def cell(value, fmt):
+        return '' if value is None else format(value, fmt)
+
+    print(f'{"operation":<14} {"problems":>8} {"wall s":>8} {"requests":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"bytes in":>10} {"bytes out":>10} {"problems/s":>10}')
+    for _ in rows:
+        print(f'{_["name"]:<14} {_["problems"]:>8} {cell(_["wall_s"], ".3f"):>8} {cell(_["requests"], ".0f"):>8} '
+              f'{cell(_["p50_ms"], ".1f"):>8} {cell(_["p95_ms"], ".1f"):>8} {cell(_["p99_ms"], ".1f"):>8} '
+              f'{_["bytes_in"]:>10} {_["bytes_out"]:>10} {cell(_["problems_per_s"], ".0f"):>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-problems', default='100,1000', help='Comma separated store sizes.')
+    parser.add_argument('-changed', type=float, default=0.01, help='Fraction of solutions edited between syncs.')
+    parser.add_argument('-repeat', type=int, default=3, help='Runs of each operation (the median wall is shown).')
+    parser.add_argument('-code-size', type=int, default=1024, help='Characters of code per solution.')
+    parser.add_argument('-json', dest='json_filename', default=None, help='Also write the results to this file.')
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = run([int(_) for _ in args.problems.split(',')], args.changed, args.repeat, args.code_size)
+    report(results)
+    if args.json_filename:
+        with open(args.json_filename, 'wt') as f:
+            json.dump(results, f, sort_keys=True, indent=4)
@@ -0,0 +1,2 @@
+# imported before anything else in the package, so ilr --timings counts every import from here on (click included)
+from ieuler import timings  # noqa: F401
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from ieuler.cache import atomic_write, evict_lru, lru_files
+
+# images and data files that problems link to live under /project/ (or /resources/) on projecteuler.net
+ASSET_URL = re.compile(r'''(?:src|href)="(https?://projecteuler\.(?:net|com)/+(?:project|resources)/[^"]+)"''')
+
+
+def find_asset_urls(problem_html: str) -> List[str]:
+    urls = []
+    for url in ASSET_URL.findall(problem_html or ''):
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def asset_name(url: str) -> str:
+    """ the file name a url points at, without its query or fragment, eg p022_names.txt """
+    return urlsplit(url).path.rsplit('/', 1)[-1]
+
+
+class AssetMirror(object):
+    """ Local copies of problem assets, stored by content hash so a file linked from many places is kept once.
+
+    index.json maps each url to its copy under objects/.  Copies are evicted least recently used first once
+    they take up more than max_size.
+    """
+
+    def __init__(self, dirname: str = None, max_size: int = 256 * 1024 * 1024):
+        self.dirname = dirname or os.getenv('IEULER_ASSETS_DIR') or '.assets'
+        self.max_size = max_size
+        self.index_filename = os.path.join(self.dirname, 'index.json')
+        self._lock = threading.Lock()
+
+    def load_index(self) -> Dict:
+        try:
+            with open(self.index_filename, 'rt') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def dump_index(self, index: Dict):
+        os.makedirs(self.dirname, exist_ok=True)
+        atomic_write(self.index_filename, json.dumps(index, sort_keys=True, indent=4).encode())
+
+    def paths(self, urls: List[str]) -> Dict[str, str]:
+        """ the local copies we have of urls """
+        index = self.load_index()
+        return {_: index[_] for _ in urls if _ in index and os.path.exists(index[_])}
+
+    def find(self, name: str) -> Optional[str]:
+        """ the local copy of an asset by url or by file name, eg p022_names.txt """
+        index = self.load_index()
+        for url in [name] + [_ for _ in index if asset_name(_) == name]:
+            path = index.get(url)
+            if path and os.path.exists(path):
+                os.utime(path)
+                return path
+
+    def add(self, url: str, content: bytes) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        extension = os.path.splitext(asset_name(url))[1]
+        path = os.path.join(self.dirname, 'objects', digest[:2], f'{digest}{extension}')
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, content)
+        return path
+
+    def update_index(self, paths: Dict[str, str]):
+        with self._lock:
+            index = self.load_index()
+            index.update(paths)
+            self.dump_index(index)
+        self.evict()
+
+    def evict(self):
+        """ remove the least recently used copies until the mirror fits in max_size """
+        _, evicted = evict_lru(lru_files(os.path.join(self.dirname, 'objects')), self.max_size)
+        if not evicted:
+            return
+        evicted = set(evicted)
+        with self._lock:
+            index = self.load_index()
+            self.dump_index({url: path for url, path in index.items() if path not in evicted})
+
+
+def open_asset(name: str, mode: str = 'rt', dirname: str = None, **kwargs):
+    """ open the mirrored copy of a problem's data file, eg open_asset('p022_names.txt'), from a solution """
+    path = AssetMirror(dirname).find(name)
+    if path is None:
+        raise FileNotFoundError(f'{name} has not been mirrored.  Try ilr prefetch --assets.')
+    return open(path, mode, **kwargs)
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import subprocess
+from typing import Dict
+
+from ieuler.cache import evict_lru, lru_files, tmp_path
+
+_toolchain_versions: Dict[str, str] = {}
+
+
+class BuildError(Exception):
+    pass
+
+
+def toolchain_version(template) -> str:
+    """ the compiler's (or interpreter's) own description of itself, asked once per process """
+    command = template.version_command()
+    key = ' '.join(command)
+    if key not in _toolchain_versions:
+        try:
+            r = subprocess.run(command, capture_output=True)
+        except FileNotFoundError:
+            raise BuildError(f'{command[0]} is not installed, it is needed for {template.language}.')
+        _toolchain_versions[key] = (r.stdout or r.stderr).decode(errors='replace').strip()
+    return _toolchain_versions[key]
+
+
+class BuildCache(object):
+    """ Compiled solutions, kept by a hash of their source, compiler version and flags so nothing is rebuilt.
+
+    Binaries are evicted least recently used first once they take up more than max_size.
+    """
+
+    def __init__(self, dirname: str = None, max_size: int = 512 * 1024 * 1024):
+        self.dirname = dirname or os.getenv('IEULER_BUILD_CACHE') or '.build-cache'
+        self.max_size = max_size
+
+    def key(self, template, source: bytes) -> str:
+        build = json.dumps([template.language, toolchain_version(template), list(template.flags)])
+        return hashlib.sha256(build.encode() + b'\0' + source).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.abspath(os.path.join(self.dirname, key[:2], key))
+
+    def build(self, template, filename: str) -> str:
+        """ the binary for filename, compiling it only if this source was never built with this toolchain """
+        with open(filename, 'rb') as f:
+            source = f.read()
+        binary = self.path(self.key(template, source))
+        if os.path.exists(binary):
+            os.utime(binary)
+            return binary
+
+        os.makedirs(os.path.dirname(binary), exist_ok=True)
+        tmp = tmp_path(binary)
+        r = subprocess.run(template.build_command(filename, tmp), capture_output=True)
+        if r.returncode != 0:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise BuildError((r.stderr or r.stdout).decode(errors='replace'))
+        os.replace(tmp, binary)
+        self.evict()
+        return binary
+
+    def evict(self):
+        """ remove the least recently used binaries until the cache fits in max_size """
+        evict_lru(lru_files(self.dirname), self.max_size)
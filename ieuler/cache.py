@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def tmp_path(path: str) -> str:
+    """ a temporary name next to path, unique to this process and thread, for writing path atomically """
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def atomic_write(path: str, *chunks: bytes):
+    """ write chunks to path so readers (in any process) see the old file or the whole new one """
+    tmp = tmp_path(path)
+    with open(tmp, 'wb') as f:
+        for _ in chunks:
+            f.write(_)
+    os.replace(tmp, path)
+
+
+def lru_files(dirname: str) -> List[Tuple[float, int, str]]:
+    """ (mtime, size, path) of every file under dirname, leaving out files still being written """
+    files = []
+    for root, _, names in os.walk(dirname):
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    return files
+
+
+def evict_lru(files: List[Tuple[float, int, str]], max_size: int) -> Tuple[int, List[str]]:
+    """ remove the least recently used (oldest mtime) of files until they fit in max_size, returns (size, evicted) """
+    size = sum(_[1] for _ in files)
+    evicted = []
+    for _, file_size, path in sorted(files):
+        if size <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        evicted.append(path)
+        size -= file_size
+    return size, evicted
+
+
+class DiskCache(object):
+    """ A size-bounded key/value store on disk, evicting the least recently used entries first.
+
+    Each entry is one file: a line of JSON metadata followed by the raw value.  The file's modification
+    time doubles as its last access time, so there is no shared index for concurrent processes to fight over.
+    """
+
+    def __init__(self, dirname: str, max_size: int = 64 * 1024 * 1024):
+        self.dirname = dirname
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dirname, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict]]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                value = f.read()
+            os.utime(path)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+        return value, meta
+
+    def set(self, key: str, value: bytes, meta: Dict = None):
+        os.makedirs(self.dirname, exist_ok=True)
+        path = self._path(key)
+        chunks = (json.dumps(meta or {}).encode() + b'\n', value)
+        with self._lock:
+            self._size = self.size() - self._file_size(path) + sum(map(len, chunks))
+            atomic_write(path, *chunks)
+        if self._size > self.max_size:
+            self.evict()
+
+    def set_meta(self, key: str, meta: Dict):
+        cached = self.get(key)
+        if cached:
+            self.set(key, cached[0], meta)
+
+    def delete(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            size = self._file_size(path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def clear(self):
+        for name in self._entries():
+            try:
+                os.unlink(os.path.join(self.dirname, name))
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(self._file_size(os.path.join(self.dirname, _)) for _ in self._entries())
+        return self._size
+
+    def evict(self):
+        """ remove the least recently used entries until the cache fits in max_size """
+        with self._lock:
+            self._size, _ = evict_lru(lru_files(self.dirname), self.max_size)
+
+    def _entries(self):
+        try:
+            return [_ for _ in os.listdir(self.dirname) if not _.endswith('.tmp')]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+
+class HTTPCache(object):
+    """ Cache GET responses in a DiskCache, revalidating stale ones with ETag/Last-Modified.
+
+    ttls maps a url class to how many seconds a response stays fresh (None means it never goes stale).
+    """
+
+    def __init__(self, cache: DiskCache, ttls: Dict[str, Optional[float]]):
+        self.cache = cache
+        self.ttls = ttls
+
+    @staticmethod
+    def key(url: str, vary: str = '') -> str:
+        return f'{url} {vary}'
+
+    def get(self, session, url: str, url_class: str, vary: str = ''):
+        key = self.key(url, vary)
+        cached = self.cache.get(key)
+        headers = {}
+        if cached:
+            content, meta = cached
+            ttl = self.ttls.get(url_class, 0)
+            if ttl is None or time.time() - meta['stored'] < ttl:
+                return self._response(session, content, meta)
+            if meta['headers'].get('ETag'):
+                headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        r = session.get(url, headers=headers)
+        if cached and r.status_code == 304:
+            content, meta = cached
+            meta['stored'] = time.time()
+            self.cache.set_meta(key, meta)
+            return self._response(session, content, meta)
+
+        if r.status_code == 200 and r.url == url:
+            self.cache.set(key, r.content, {'url': r.url,
+                                            'status_code': r.status_code,
+                                            'encoding': r.encoding,
+                                            'headers': dict(r.headers),
+                                            'stored': time.time()})
+        return r
+
+    def forget(self, url: str, vary: str = ''):
+        self.cache.delete(self.key(url, vary))
+
+    @staticmethod
+    def _response(session, content: bytes, meta: Dict):
+        import requests
+        import requests_html
+
+        r = requests.Response()
+        r._content = content
+        r.status_code = meta['status_code']
+        r.url = meta['url']
+        r.encoding = meta['encoding']
+        r.headers = requests.structures.CaseInsensitiveDict(meta['headers'])
+        return requests_html.HTMLResponse._from_response(r, session)
@@ -1,19 +1,41 @@
 import functools
 import json
+import os
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
 import click
-import requests
 
-from ieuler.client import Client, LoginUnsuccessful, BadCaptcha, require_login
+from ieuler import timings, tracing
+from ieuler.build import BuildError
+from ieuler.client import Client, LoginUnsuccessful, BadCaptcha, RateLimiter, require_login
 from ieuler.language_templates import get_template, supported_languages
+from ieuler.results import ResultCache
+from ieuler.runner import ONE_MINUTE, Limits, RunResult, run
+from ieuler.search import SearchUnavailable
+from ieuler.storage import SORTS
+from ieuler.submissions import SubmissionQueue
+
+timings.record('import ieuler.cli')
 
 context_settings = {'context_settings': dict(max_content_width=300)}
 
 
 class Session(object):
-    def __init__(self):
-        self.client = Client()
+    def __init__(self, **client_kwargs):
+        self.client_kwargs = client_kwargs
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with timings.timed('create client'):
+                self._client = Client(**self.client_kwargs)
+        return self._client
 
 
 @require_login
@@ -21,13 +43,98 @@ def _login(client):
     pass
 
 
+def parse_range(problem_range: str) -> List[int]:
+    """ '1-10,15' -> [1, 2, ..., 10, 15] """
+    numbers = set()
+    for part in problem_range.split(','):
+        if not part.strip():
+            continue
+        try:
+            start, _, end = part.partition('-')
+            start, end = int(start), int(end or start)
+        except ValueError:
+            raise click.BadParameter(f'{part} is not a problem number or range like 1-10')
+        if start < 1:
+            raise click.BadParameter(f'{part}: problems are numbered from 1')
+        numbers.update(range(start, end + 1))
+    return sorted(numbers)
+
+
+def sync_solution_file(problem: Dict, language: str) -> str:
+    """ make the stored filecontent and the solution file agree (the file wins), returns the filename """
+    code = problem['code']
+    filename = f'{problem["ID"]}{get_template(language).extension}'
+    try:
+        with open(filename, 'rt') as f:
+            code[language].update({'filecontent': f.read()})
+    except FileNotFoundError:
+        with open(filename, 'wt') as f:
+            f.write(code[language]['filecontent'])
+    return filename
+
+
+def run_solution(language: str, filename: str, warm: bool = True, reuse: bool = True, **kwargs) -> RunResult:
+    """ run a solution file, in a child of the warm runner when it is up and the language is python3
+
+    Compiled languages are built first, unless the build cache already has this source.  With reuse, a solution
+    that already ran ok with the same source and toolchain isn't run again: its earlier result is returned.
+    """
+    with tracing.span('run solution', language=language) as span:
+        result = _run_solution(language, filename, warm, reuse, **kwargs)
+        span.set(exit_reason=result.exit_reason, cached=result.cached)
+        return result
+
+
+def _run_solution(language: str, filename: str, warm: bool, reuse: bool, **kwargs) -> RunResult:
+    results = ResultCache()
+    key = results.key(language, filename)
+    if reuse and key:
+        with tracing.span('result cache lookup'):
+            result = results.get(key)
+        if result:
+            if kwargs.get('on_stdout'):
+                for line in result.stdout.splitlines(keepends=True):
+                    kwargs['on_stdout'](line)
+            return result
+
+    from ieuler import forkserver
+
+    if warm and language == 'python3' and forkserver.available():
+        result = forkserver.run(filename, **kwargs)
+    else:
+        try:
+            command = get_template(language).command(filename)
+        except BuildError as e:
+            if kwargs.get('on_stderr'):
+                kwargs['on_stderr'](f'{e}\n'.encode())
+            return RunResult([language, filename], stderr=f'{e}'.encode(), exit_reason='build-error')
+        result = run(command, **kwargs)
+
+    if key:
+        results.set(key, result)
+    return result
+
+
+def run_solutions(runs: List[Tuple[Dict, str, str]], workers: int = None, **kwargs) -> List[RunResult]:
+    """ run (problem, language, filename) solutions in parallel, cold, returning their results in the same order """
+    def execute(_run):
+        problem, language, filename = _run
+        try:
+            return run_solution(language, filename, warm=False, **kwargs)
+        except OSError as e:
+            return RunResult([language, filename], stderr=f'{e}'.encode(), exit_reason='error')
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        return list(executor.map(execute, runs))
+
+
 def require_fetch(func):
     @click.pass_context
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         ctx = args[0]
         session = args[1]
-        if not session.client.problems:
+        if not session.client.has_problems():
             ctx.invoke(fetch)
 
         r = func(*args[1:], **kwargs)
@@ -37,8 +144,12 @@ def require_fetch(func):
 
 
 @click.group(**context_settings)
+@click.option('--no-cache', is_flag=True, default=False, help='Always go to Project Euler instead of the local page cache.')
+@click.option('--timings', 'show_timings', is_flag=True, default=False, help='Report where startup time went.')
+@click.option('-trace', '--trace', type=str, default=None, metavar='FILE',
+              help='Write a Chrome trace of where the command\'s time went (JSON lines if FILE ends in .jsonl).')
 @click.pass_context
-def ilr(ctx):
+def ilr(ctx, no_cache, show_timings, trace):
     """
     Welcome to Interactive Project Euler Command Line Tool!
 
@@ -48,8 +159,30 @@ def ilr(ctx):
 
     Happy trails!
      """
+    if trace:
+        start_trace(ctx, trace)
+
     if not ctx.obj:  # we don't want to overwrite the context when testing
-        ctx.obj = Session()
+        ctx.obj = Session(use_cache=not no_cache)
+    elif no_cache:
+        ctx.obj.client.disable_cache()
+
+    if show_timings:
+        ctx.call_on_close(lambda: click.echo(timings.report(), err=True))
+
+
+def start_trace(ctx, filename: str):
+    """ trace the command into filename, as one root span with the phases under it """
+    tracing.start()
+    root = tracing.span(f'ilr {ctx.invoked_subcommand}', argv=sys.argv[1:]).__enter__()
+
+    def write():
+        root.__exit__(None, None, None)
+        tracer = tracing.stop(filename)
+        click.echo(f'Traced {len(tracer.events)} spans and {tracer.totals["requests"]} requests to {filename}',
+                   err=True)
+
+    ctx.call_on_close(write)
 
 
 @ilr.command(**context_settings)
@@ -105,8 +238,12 @@ def login(session):
 @click.option('--update-from-project-euler/--skip-pe-update', default=True)
 @click.option('--update-from-ieuler-server/--skip-ipe-update', default=True)
 @click.option('--as-user/--anonymous', default=True)
+@click.option('--incremental/--full', default=True,
+              help='Only read the archive pages past the problems you already have, or re-read all of them.')
+@click.option('-concurrency', type=int, nargs=1, default=None,
+              help='How many archive pages to fetch at once (default: $IEULER_FETCH_CONCURRENCY or 8).')
 @click.pass_obj
-def fetch(session, as_user, update_from_project_euler, update_from_ieuler_server):
+def fetch(session, as_user, update_from_project_euler, update_from_ieuler_server, incremental, concurrency):
     """ Fetch the problems from Project Euler & Interactive Project Euler. See config for default server. """
 
     if as_user:
@@ -116,18 +253,22 @@ def fetch(session, as_user, update_from_project_euler, update_from_ieuler_server
             click.echo(e)
             return
 
+    import requests
+
     if update_from_ieuler_server:
         try:
-            session.client.ping_ipe()
+            session.client.check_ipe()
             try:
-                ipe_problems = session.client.get_from_ipe()
+                # only what changed on the server since the last sync (unless --full)
+                ipe_problems = session.client.get_from_ipe(full=not incremental)
                 click.echo('Fetched problems from ieuler-server successfully.')
                 if ipe_problems:
                     if not session.client.problems:
                         # don't care if they don't want to fetch from ieuler, they need to because there are no problems
-                        session.client.update_all_problems()
+                        session.client.update_all_problems(concurrency=concurrency)
                         update_from_project_euler = False  # since we just did, don't need to do it again
                     session.client.update_problems(ipe_problems)
+                session.client.ack_pulled(ipe_problems)
 
             except BadCaptcha as e:
                 click.echo(e)
@@ -138,71 +279,170 @@ def fetch(session, as_user, update_from_project_euler, update_from_ieuler_server
             click.echo('ieuler server is not running.')
 
     if update_from_project_euler:
-        session.client.update_all_problems()
+        if incremental and session.client.problems:
+            new_problems = session.client.sync_problems(concurrency=concurrency)
+            click.echo(f'Fetched {len(new_problems)} new problem(s) from Project Euler.')
+        else:
+            session.client.update_all_problems(concurrency=concurrency)
+
+
+@ilr.command(**context_settings)
+@click.option('--all', 'all_problems', is_flag=True, default=False, help='Every problem.')
+@click.option('--unsolved', is_flag=True, default=False, help='Only problems you have not solved.')
+@click.option('--assets/--no-assets', default=False,
+              help='Also keep local copies of the images and data files the problems link to.')
+@click.option('-concurrency', type=int, nargs=1, default=None,
+              help='How many problems to fetch at once (default: $IEULER_FETCH_CONCURRENCY or 8).')
+@click.option('-rate', type=float, nargs=1, default=None,
+              help='At most this many requests a second, 0 for no limit (default: $IEULER_FETCH_RATE or 5).')
+@click.argument('problem-range', nargs=1, type=str, required=False, default='')
+@click.pass_obj
+@require_fetch
+def prefetch(session, problem_range, all_problems, unsolved, assets, concurrency, rate):
+    """ Fetch problem statements ahead of time (eg 1-100) so solve doesn't need the network. """
+    if not (problem_range or all_problems or unsolved):
+        click.echo('Which problems?  Give a range like 1-100, --all or --unsolved.')
+        return
+
+    problems = session.client.problems
+    if problem_range:
+        problems = [problems[_ - 1] for _ in parse_range(problem_range) if _ <= len(problems)]
+    if unsolved:
+        problems = [_ for _ in problems if not _.get('Solved')]
+
+    numbers = [int(_['ID']) for _ in problems if 'Problem' not in _]
+    errors = {}
+    if numbers:
+        session.client.prefetch_problems(numbers, concurrency=concurrency, rate=rate, errors=errors)
+    click.echo(f'Fetched {len(numbers) - len(errors)} problem(s), {len(problems) - len(numbers)} already stored.')
+    if errors:
+        click.echo(f'Could not fetch {len(errors)} problem(s), run the same prefetch again to retry them:')
+        for number in sorted(errors)[:10]:
+            click.echo(f'  {number}: {type(errors[number]).__name__}: {errors[number]}'[:120])
+        if len(errors) > 10:
+            click.echo(f'  and {len(errors) - 10} more.')
+
+    if assets:
+        problems = [session.client.problems[_ - 1] for _ in sorted(int(_['ID']) for _ in problems)]
+        mirrored = session.client.mirror_assets(problems, concurrency=concurrency, rate=rate)
+        click.echo(f'Mirrored the assets of {len(mirrored)} problem(s) in {session.client.asset_mirror.dirname}.')
 
 
 @ilr.command(**context_settings)
 @click.option('--echo/--silent', default=True)
+@click.option('--delta/--full', default=True,
+              help='Only send the problems that changed since the server last acknowledged them, or send them all.')
 @click.argument('problem-number', nargs=1, type=int, required=False, default=0)
 @click.pass_obj
 @require_fetch
-def send(session, problem_number, echo):
+def send(session, problem_number, echo, delta):
     """ Send the problem(s) to Interactive Project Euler.  See config for default server. """
-    problems = []
     if problem_number == 0:
         _problems = session.client.problems
     else:
         _problems = [session.client.problems[int(problem_number) - 1]]
 
-    for _ in _problems:
-        problem = {}
-        # save problems for which there is code
-        if 'code' in _:
-            problem.update({'code': _['code']})
-            problem.update({'Solved': _.get('Solved')})
-            problem.update({'completed_on': _.get('completed_on')})
-            problem.update({'correct_answer': _.get('correct_answer')})
-
-        if problem:
-            problem.update({'ID': _['ID']})
-            problems.append(problem)
+    # save problems for which there is code
+    problems = [_ for _ in _problems if 'code' in _]
 
     if not problems:
         click.echo('No work to send.  Try ilr solve.')
     else:
+        import requests
+
         try:
-            session.client.ping_ipe()
+            session.client.check_ipe()
+            responses = session.client.sync_to_ipe(problems, full=not delta)
+            if echo and not responses:
+                click.echo('Nothing changed since the last send.')
+            for r in responses:
+                if r and echo:
+                    click.echo('Response:')
+                    click.echo(json.dumps(r, sort_keys=True, indent=4))
+
         except requests.exceptions.ConnectionError:
             if echo:
                 click.echo('ieuler server is not running.  Cannot send/save to server.')
-            return
-        try:
-            r = session.client.send_to_ipe(problems)
-            if r and echo:
-                click.echo('Response:')
-                click.echo(json.dumps(r, sort_keys=True, indent=4))
-
         except BadCaptcha as e:
             click.echo(e)
         except LoginUnsuccessful as e:
             click.echo(e)
 
 
+def ls_output(problems: List[Dict]):
+    """ what ls shows of each problem """
+    for _ in problems:
+        display_data = {}
+        for k in _:
+            if k in Client.INHERENT_FIELDS:
+                display_data.update({k: _[k]})
+        yield json.dumps(display_data, sort_keys=True, indent=4)
+
+
+def solution_template(problem: Dict, language_template) -> str:
+    """ a new solution file for problem, with the problem's details at the top """
+    content_dict = {_: problem[_] for _ in problem if _ in Client.TEMPLATE_FIELDS}
+    return language_template.template(json.dumps(content_dict, sort_keys=True, indent=4))
+
+
+def ls_table(rows):
+    """ ls -table: one line per problem """
+    yield f'{"ID":>5}  {"Solved":<6}  {"Solved By":>9}  {"Code":<16}  Title\n'
+    for _ in rows:
+        solved_by = '' if _['Solved By'] is None else _['Solved By']
+        yield f'{_["ID"]:>5}  {"yes" if _["Solved"] else "":<6}  {solved_by:>9}  {",".join(_["languages"]):<16}  ' \
+              f'{_["Description / Title"] or ""}\n'
+
+
 @ilr.command(**context_settings)
+@click.option('--solved/--unsolved', default=None, help='Only the problems you have (or have not) solved.')
+@click.option('-id-range', type=str, default=None, help='Only these problems, eg 100-200 or 1-10,15.')
+@click.option('-min-solved-by', type=int, default=None, help='Only problems solved by at least this many people.')
+@click.option('-max-solved-by', type=int, default=None, help='Only problems solved by at most this many people.')
+@click.option('-language', type=str, default=None, help='Only problems with code in this language.')
+@click.option('-sort', type=click.Choice(list(SORTS)), default='id', show_default=True)
+@click.option('--reverse', is_flag=True, default=False, help='Sort descending.')
+@click.option('--table/--json', default=False, help='One line per problem, or the JSON of each (the default).')
 @click.pass_obj
 @require_fetch
-def ls(session):
-    """ List out the problems from Project Euler. """
+def ls(session, solved, id_range, min_solved_by, max_solved_by, language, sort, reverse, table):
+    """ List out the problems from Project Euler, filtered and sorted. """
+    ids = parse_range(id_range) if id_range else None
+    with tracing.span('store query', table=table):
+        rows = session.client.store.query(solved=solved, ids=ids, min_solved_by=min_solved_by,
+                                          max_solved_by=max_solved_by, language=language, sort=sort,
+                                          reverse=reverse, full=not table)
+    click.echo_via_pager(ls_table(rows) if table else ls_output(rows))
 
-    def _generate_output():
-        for _ in session.client.problems:
-            display_data = {}
-            for k in _:
-                if k in Client.INHERENT_FIELDS:
-                    display_data.update({k: _[k]})
-            yield json.dumps(display_data, sort_keys=True, indent=4)
 
-    click.echo_via_pager(_generate_output)
+@ilr.command(**context_settings)
+@click.argument('query', nargs=-1, required=True)
+@click.option('-limit', type=int, default=10, show_default=True, help='Show at most this many problems.')
+@click.option('--reindex', is_flag=True, default=False, help='Rebuild the search index from the stored problems.')
+@click.pass_obj
+@require_fetch
+def search(session, query, limit, reindex):
+    """ Search the problem titles and statements, best match first. """
+    index = session.client.search_index
+    try:
+        if reindex or not len(index):
+            # an index made before this version, or thrown away: build it from the store once
+            with tracing.span('search index', problems=len(session.client.problems)):
+                if reindex:
+                    index.clear()
+                index.update(session.client.problems)
+
+        with tracing.span('search'):
+            results = index.search(' '.join(query), limit=limit)
+    except SearchUnavailable as e:
+        click.echo(e)
+        return
+    if not results:
+        click.echo('No problems match.  Statements are only searchable once fetched, eg by ilr prefetch.')
+    for _ in results:
+        click.echo(f'{_["ID"]:>5}  {_["Description / Title"]}')
+        if _['snippet']:
+            click.echo(f'       {_["snippet"]}')
 
 
 @ilr.command(**context_settings)
@@ -216,14 +456,60 @@ def view(session, problem_number):
     click.echo(json.dumps(problem, sort_keys=True, indent=4))
 
 
+def watch_solution(session, problem: Dict, language: str, filename: str, timeout: float = ONE_MINUTE):
+    """ re-run filename each time it is saved, until ctrl-c, cancelling a run that a newer save made stale """
+    from ieuler.watch import watch_file
+
+    code = problem['code'][language]
+    state = {'thread': None, 'cancel': None}
+
+    def execute(cancel):
+        result = run_solution(language, filename, timeout=timeout, cancel=cancel,
+                              on_stdout=lambda line: click.echo(line, nl=False))
+        if result.exit_reason == 'cancelled':
+            click.echo('Cancelled: the file changed.')
+            return
+        if result.exit_reason != 'ok':
+            click.echo(result.stderr.decode(errors='replace'), nl=False, err=True)
+        click.echo(f'Answer: {result.answer} ({result.summary()})')
+
+    def on_change():
+        with open(filename, 'rt') as f:
+            file_content = f.read()
+        if file_content == code.get('filecontent') and state['thread']:
+            return  # saved without changes
+        code['filecontent'] = file_content
+        session.client.update_problems([{'ID': problem['ID'], 'code': problem['code']}])  # just this row
+
+        if state['thread']:
+            state['cancel'].set()
+            state['thread'].join()
+        state['cancel'] = threading.Event()
+        state['thread'] = threading.Thread(target=execute, args=(state['cancel'],), daemon=True)
+        state['thread'].start()
+
+    click.echo(f'Watching {filename}, running it on every save.  Press ctrl-c to stop.')
+    on_change()
+    try:
+        watch_file(filename, on_change)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if state['thread']:
+            state['cancel'].set()
+            state['thread'].join()
+
+
 @ilr.command(**context_settings)
 @click.option('--edit/--no-edit', default=True)
+@click.option('--watch', is_flag=True, default=False,
+              help='Instead of opening an editor, re-run the file each time it is saved (until ctrl-c).')
 @click.option('-language', nargs=1, type=str, default=None, help=f'Choose from: {supported_languages()}')
 @click.argument('problem-number', nargs=1, type=int, required=True)
 @click.pass_context
 @click.pass_obj
 @require_fetch
-def solve(session, ctx, problem_number, language, edit):
+def solve(session, ctx, problem_number, language, edit, watch):
     """ Solve a problem in your language of choice.  See config for defaults. """
 
     if not language:
@@ -246,18 +532,11 @@ def solve(session, ctx, problem_number, language, edit):
     file_name = f'{problem["ID"]}{language_template.extension}'
 
     if not problem.get('code'):
-        content_dict = {_: problem[_] for _ in problem if _ in Client.TEMPLATE_FIELDS}
-        content = json.dumps(content_dict, sort_keys=True, indent=4)
-        problem['code'] = {
-            language_template.language: {'filename': file_name,
-                                         'filecontent': language_template.template(content),
-                                         'submission': None}}
+        problem['code'] = {}
 
     if not problem['code'].get(language_template.language):
-        content_dict = {_: problem[_] for _ in problem if _ in Client.TEMPLATE_FIELDS}
-        content = json.dumps(content_dict, sort_keys=True, indent=4)
         problem['code'][language_template.language] = {'filename': file_name,
-                                                       'filecontent': language_template.template(content),
+                                                       'filecontent': solution_template(problem, language_template),
                                                        'submission': None}
 
     file_content = problem['code'][language_template.language]['filecontent']
@@ -269,7 +548,9 @@ def solve(session, ctx, problem_number, language, edit):
             file_content = f.read()
             problem['code'][language_template.language].update({'filecontent': file_content})
 
-    if edit:
+    if watch:
+        watch_solution(session, problem, language_template.language, file_name)
+    elif edit:
         click.edit(filename=file_name)
         # we also want to update the problem after they edit it
         with open(file_name, 'rt') as f:
@@ -285,13 +566,34 @@ def solve(session, ctx, problem_number, language, edit):
 @click.option('-language', type=str, nargs=1, help=f'Choose from: {supported_languages()}')
 @click.option('--dry/--live', default=False,
               help=f'The --dry option will execute your file but not submit to Project Euler.')
-@click.argument('problem-number', nargs=1, type=int, required=True)
+@click.option('-timeout', type=float, nargs=1, default=ONE_MINUTE, help='Seconds before the run is killed.')
+@click.option('-memory-limit', type=int, nargs=1, default=None,
+              help='Address space limit in MB (default: $IEULER_MEMORY_LIMIT or none).')
+@click.option('-cpu-limit', type=int, nargs=1, default=None,
+              help='CPU seconds limit (default: $IEULER_CPU_LIMIT or none).')
+@click.option('--warm/--cold', default=True, help='Run python3 solutions on the warm runner if it is up (see ilr runner).')
+@click.option('--rerun', is_flag=True, default=False,
+              help='Run the file even if this exact code already ran, instead of reusing its answer.')
+@click.option('-queue', '--queue', 'queue_range', type=str, default=None, is_flag=False, flag_value='',
+              help='Run the solutions of a range (eg 1-10) in parallel, queue their answers, then submit the queue.  '
+                   'Without a range, submit what an interrupted queue left.')
+@click.option('-rate', type=float, nargs=1, default=None,
+              help='Queued answers submitted per second, 0 for no limit (default: $IEULER_SUBMIT_RATE or 0.5).')
+@click.argument('problem-number', nargs=1, type=int, required=False, default=None)
 @click.pass_context
 @click.pass_obj
 @require_fetch
-def submit(session, ctx, problem_number, dry, language):
+def submit(session, ctx, problem_number, dry, language, timeout, memory_limit, cpu_limit, warm, rerun, queue_range,
+           rate):
     """ Execute a file and submit its stdout to Project Euler. """
 
+    if queue_range is not None:
+        submit_queue(session, ctx, queue_range, language=language, dry=dry, timeout=timeout,
+                     limits=Limits.from_env(memory_mb=memory_limit, cpu=cpu_limit), rerun=rerun, rate=rate)
+        return
+    if problem_number is None:
+        raise click.UsageError('Give a problem number, or a range with --queue.')
+
     # look for the code to run in session.self.problems
     problem = session.client.problems[problem_number - 1]
     code = problem.get('code')
@@ -323,7 +625,7 @@ def submit(session, ctx, problem_number, dry, language):
                 break  # take the first language that has not been submitted
         if submission_language is None:
             click.echo(
-                f'You have already submitted this problem in {_language}.  You may solve it again in another language (or manually change a "submission" key to null in {session.client.problems_filename}).')
+                f'You have already submitted this problem in {_language}.  You may solve it again in another language (or forget a submission with ilr unsubmit {problem_number}).')
             return
 
         if language:
@@ -336,36 +638,32 @@ def submit(session, ctx, problem_number, dry, language):
     else:
         submission_language = _language[0]
 
-    language_template = get_template(submission_language)
-
-    filename = f'{problem_number}{language_template.extension}'
-
     # update the filecontent (we want self.problems.problem to be in sync with potential changes to file by user)
-    try:
-        with open(filename, 'rt') as f:
-            code[submission_language].update({'filecontent': f.read()})
-            problem['code'].update(code)
-    except FileNotFoundError:
-        with open(filename, 'wt') as f:
-            f.write(code[submission_language]['filecontent'])
+    filename = sync_solution_file(problem, submission_language)
 
     session.client.update_problems([problem])
 
-    # execute the file
+    if not dry:
+        session.client.prefetch_submit(problem_number)  # ready to submit as soon as the answer is
+
+    # execute the file, showing its output as it goes
     # get the result from stdout
-    command = [submission_language, filename]
-    try:
-        answer = subprocess.run(command, capture_output=True, timeout=60)
-    except subprocess.TimeoutExpired as e:
-        click.echo(e)
-        return
+    result = run_solution(submission_language, filename, warm=warm, reuse=not rerun, timeout=timeout,
+                          limits=Limits.from_env(memory_mb=memory_limit, cpu=cpu_limit),
+                          on_stdout=lambda line: click.echo(line.decode(errors='replace'), nl=False),
+                          on_stderr=lambda line: click.echo(line.decode(errors='replace'), nl=False, err=True))
+    command = result.command
+    click.echo(f'Ran {command}: {result.summary()}')
+
+    problem.setdefault('last_run', {})[submission_language] = result.as_dict()  # kept out of code, which is synced
+    session.client.update_problems([problem])
 
-    if answer.returncode != 0:
-        click.echo('Oops, there was an error running the file:')
-        click.echo(answer.stderr)
+    if result.exit_reason != 'ok':
+        # its stderr was shown as it ran
+        click.echo(f'Oops, there was an error running the file: {result.exit_reason}.')
         return
 
-    answer = answer.stdout.decode().strip('\n')
+    answer = result.answer
     if dry:
         click.echo(f'Result of executing: {command}: {answer}')
         return
@@ -394,3 +692,216 @@ def submit(session, ctx, problem_number, dry, language):
     problem['code'].update(code)
     session.client.update_problems([problem])
     ctx.invoke(send, problem_number=problem_number, echo=False)
+
+
+@ilr.command(**context_settings)
+@click.option('-language', type=str, nargs=1, default=None, help='Only this language (default: all of them).')
+@click.argument('problem-number', nargs=1, type=int, required=True)
+@click.pass_obj
+@require_fetch
+def unsubmit(session, problem_number, language):
+    """ Forget a problem's submission so it can be submitted again. """
+    code = session.client.problems[problem_number - 1].get('code') or {}
+    languages = [language] if language else list(code)
+    if not any(code.get(_, {}).get('submission') is not None for _ in languages):
+        click.echo(f'There is no submission to forget for problem {problem_number}.')
+        return
+
+    for _ in languages:
+        if _ in code:
+            code[_]['submission'] = None
+    session.client.update_problems([{'ID': problem_number, 'code': code}])
+    click.echo(f'Forgot the submission of problem {problem_number} in {", ".join(_ for _ in languages if _ in code)}.')
+
+
+def submission_language(problem: Dict, language: str = None):
+    """ the language to submit a problem in: language if it has code in it, else the first not yet submitted """
+    code = problem.get('code') or {}
+    if language:
+        return language if language in code else None
+    for lang in code:
+        if code[lang].get('submission') is None:
+            return lang
+
+
+def submit_queue(session, ctx, problem_range: str, language: str = None, dry: bool = False,
+                 timeout: float = ONE_MINUTE, limits: Limits = None, rerun: bool = False, rate: float = None):
+    """ run a range of solutions in parallel into the submission queue, then submit the queue one at a time """
+    queue = SubmissionQueue()
+    problems = session.client.problems
+
+    runs = []
+    for number in parse_range(problem_range):
+        problem = problems[number - 1] if 0 < number <= len(problems) else None
+        if problem is None:
+            continue
+        if problem.get('Solved'):
+            click.echo(f'{number}: already solved.')
+            continue
+        lang = submission_language(problem, language)
+        if lang is None:
+            click.echo(f'{number}: nothing left to submit.  Use ilr solve first.')
+            continue
+        runs.append((problem, lang, sync_solution_file(problem, lang)))
+
+    results = run_solutions(runs, reuse=not rerun, timeout=timeout, limits=limits)
+
+    queued = []
+    for (problem, lang, filename), result in zip(runs, results):
+        problem.setdefault('last_run', {})[lang] = result.as_dict()
+        click.echo(f'{problem["ID"]}: ran {result.command}: {result.summary()}')
+        if result.exit_reason == 'ok':
+            queued.append({'ID': problem['ID'], 'language': lang, 'answer': result.answer})
+    if runs:
+        session.client.update_problems([problem for problem, lang, filename in runs])
+    if dry:
+        for _ in queued:
+            click.echo(f'{_["ID"]}: {_["answer"]}')
+        return
+    queue.put(queued)
+
+    entries = queue.load()
+    if not entries:
+        click.echo('There is nothing to submit.')
+        return
+    click.echo(f'Submitting {len(entries)} answer(s).')
+    limiter = RateLimiter(float(os.getenv('IEULER_SUBMIT_RATE') or 0.5) if rate is None else rate)
+    submitted = []
+    for i, entry in enumerate(entries):
+        number, lang, answer = int(entry['ID']), entry['language'], entry['answer']
+        problem = problems[number - 1] if 0 < number <= len(problems) else None
+        if problem is None:
+            click.echo(f'{number}: not a stored problem, dropped from the queue.')
+            queue.remove(number)
+            continue
+        if problem.get('Solved'):
+            click.echo(f'{number}: already solved.')
+            queue.remove(number)
+            continue
+
+        limiter.wait()
+        if i + 1 < len(entries):
+            session.client.prefetch(f'https://projecteuler.net/problem={entries[i + 1]["ID"]}')
+        try:
+            response = session.client.submit(number, answer)
+        except (LoginUnsuccessful, BadCaptcha) as e:
+            click.echo(f'{number}: {e}')
+            click.echo(f'Stopped with {len(queue)} answer(s) still queued.  Run ilr submit --queue to carry on.')
+            break
+
+        problem.update(response)
+        problem['code'][lang].update({'submission': answer})
+        submitted.append(problem)
+        queue.remove(number)
+        if answer == response['correct_answer']:
+            click.echo(f'{number}: {answer} is correct.  {response["completed_on"]}')
+        else:
+            click.echo(f'{number}: {answer} is not the answer.')
+
+    if submitted:
+        session.client.update_problems(submitted)
+        ctx.invoke(send, echo=False)
+
+
+@ilr.command(**context_settings)
+@click.option('-language', type=str, nargs=1, default=None, help=f'Only solutions in: {supported_languages()}')
+@click.option('-sort', type=click.Choice(['id', 'wall', 'cpu', 'memory', 'status']), default='id',
+              help='Order of the table.')
+@click.option('-json', 'json_filename', type=str, nargs=1, default=None,
+              help='Also write the results as JSON to this file ("-" for stdout).')
+@click.option('-workers', type=int, nargs=1, default=None, help='How many solutions to run at once (default: CPUs).')
+@click.option('-timeout', type=float, nargs=1, default=2 * ONE_MINUTE, help='Seconds before a run is killed.')
+@click.argument('problem-range', nargs=1, type=str, required=False, default='')
+@click.pass_obj
+@require_fetch
+def bench(session, problem_range, language, sort, json_filename, workers, timeout):
+    """ Run your saved solutions (eg 1-100) in parallel and check their answers and cost. """
+    problems = session.client.problems
+    if problem_range:
+        problems = [problems[_ - 1] for _ in parse_range(problem_range) if _ <= len(problems)]
+
+    runs = []
+    for problem in problems:
+        for lang in problem.get('code') or {}:
+            if get_template(lang) and (language is None or lang == language):
+                runs.append((problem, lang, sync_solution_file(problem, lang)))
+    if not runs:
+        click.echo('There are no solutions to run.  Use ilr solve first.')
+        return
+
+    results = run_solutions(runs, workers=workers, reuse=False, timeout=timeout, limits=Limits.from_env())
+
+    rows = []
+    for (problem, lang, filename), result in zip(runs, results):
+        correct_answer = problem.get('correct_answer')
+        if result.exit_reason != 'ok':
+            status = result.exit_reason
+        elif correct_answer is None:
+            status = 'unknown'
+        else:
+            status = 'correct' if result.answer == correct_answer else 'wrong'
+        rows.append(dict(result.as_dict(), ID=problem['ID'], language=lang, answer=result.answer,
+                         correct_answer=correct_answer, status=status, over_one_minute=result.over_one_minute))
+
+    session.client.update_problems([problem for problem, lang, filename in runs])
+
+    sort_keys = {'id': lambda _: (_['ID'], _['language']),
+                 'wall': lambda _: -(_['wall_time'] or 0),
+                 'cpu': lambda _: -(_['cpu_time'] or 0),
+                 'memory': lambda _: -(_['max_rss'] or 0),
+                 'status': lambda _: (_['status'], _['ID'])}
+    rows.sort(key=sort_keys[sort])
+
+    def seconds(_):
+        return '' if _ is None else f'{_:.3f}'
+
+    click.echo(f'{"ID":>5}  {"language":<9} {"status":<8} {"wall s":>9} {"cpu s":>9} {"peak MB":>8}  answer')
+    for _ in rows:
+        memory = '' if _['max_rss'] is None else f'{_["max_rss"] / 2 ** 20:.1f}'
+        flag = '  (over one minute!)' if _['over_one_minute'] else ''
+        click.echo(f'{_["ID"]:>5}  {_["language"]:<9} {_["status"]:<8} {seconds(_["wall_time"]):>9} '
+                   f'{seconds(_["cpu_time"]):>9} {memory:>8}  {_["answer"]}{flag}')
+
+    if json_filename == '-':
+        click.echo(json.dumps(rows, sort_keys=True, indent=4))
+    elif json_filename:
+        with open(json_filename, 'wt') as f:
+            json.dump(rows, f, sort_keys=True, indent=4)
+
+
+@ilr.command(**context_settings)
+@click.option('-preload', type=str, nargs=1, default='',
+              help='Comma separated modules to import once up front, eg numpy,sympy.')
+@click.argument('action', nargs=1, type=click.Choice(['start', 'stop', 'status']), required=True)
+def runner(action, preload):
+    """ Start, stop or check the warm runner that makes repeated python3 runs start instantly. """
+    from ieuler import forkserver
+
+    address = forkserver.DEFAULT_ADDRESS
+    status = forkserver.status(address)
+
+    if action == 'start':
+        if status:
+            click.echo(f'The runner is already up: {json.dumps(status, sort_keys=True)}')
+            return
+        subprocess.Popen([sys.executable, '-m', 'ieuler.forkserver', address, preload],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        for _ in range(600):  # preloading can take a while
+            status = forkserver.status(address)
+            if status:
+                break
+            time.sleep(0.05)
+        else:
+            click.echo('The runner did not start.')
+            return
+
+    if action == 'stop':
+        forkserver.stop(address)
+        click.echo('The runner is stopped.')
+        return
+
+    if status:
+        click.echo(f'The runner is up: {json.dumps(status, sort_keys=True)}')
+    else:
+        click.echo('The runner is not running.')
@@ -1,28 +1,45 @@
+import contextlib
 import functools
+import gzip
+import hashlib
 import io
 import json
 import os
 import random
 import re
+import sqlite3
+import threading
+import time
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from typing import Union, Tuple, List, Dict
 
 import click
-import requests_html
-import requests
 import rever
-from PIL import Image
 
+from ieuler import timings, tracing
+from ieuler.assets import AssetMirror, find_asset_urls
+from ieuler.cache import DiskCache, HTTPCache
 from ieuler.language_templates import Python, get_template
-from ieuler.terminal_image_viewer import show_image
+from ieuler.parsing import parse_archive_page, parse_page_qty, parse_problem_page
+from ieuler.search import SEARCH_FIELDS, SearchIndex, SearchUnavailable
+from ieuler.storage import get_store, supported_stores
+from ieuler.sync import SYNC_VERSION, SyncState, sync_payload
 
 
 class Captcha(object):
     def __init__(self, captcha_bytes: bytes):
+        with timings.timed('import PIL'):
+            from PIL import Image  # only needed when there is a captcha to show
+
         self.captcha_bytes = captcha_bytes
         self.img = Image.open(io.BytesIO(self.captcha_bytes))
         self.input = None
 
     def show_in_terminal(self):
+        with timings.timed('import terminal image viewer'):
+            from ieuler.terminal_image_viewer import show_image
+
         show_image(self.img)
         self.get_input()
 
@@ -30,44 +47,99 @@ class Captcha(object):
         self.input = input('Please enter the captcha: ')
 
 
+def _verify_login(self):
+    credentials = self.load_credentials()
+    cookies = self.load_cookies()
+    if self.login_verified(username=credentials.get('username'), cookies=cookies):
+        self.session.cookies.update(cookies)
+        return
+
+    logged_in = self.logged_in(username=credentials.get('username'), cookies=cookies)
+    if not logged_in:
+        self.prefetch_login()  # while the user reads the prompts
+        if not credentials:
+            click.confirm('A login is required.  Would you like to continue?', abort=True)
+            username, password = self.get_user_input_credentials()
+        else:
+            username, password = credentials['username'], credentials['password']
+
+        self.login(username, password)
+
+        logged_in = self.logged_in(username=username, cookies=cookies)
+        if not logged_in:
+            raise LoginUnsuccessful('Sorry, the username/password is not right.')
+
+        # save the username and password (so we don't have to keep asking)
+        self.dump_credentials({'username': username, 'password': password})
+
+        # now save the cookies (so that we can remain logged in)
+        cookies = self.session.cookies.get_dict()
+        self.dump_cookies(cookies)
+        credentials = {'username': username}
+
+    # trust this session until it expires or Project Euler says otherwise
+    self.remember_login(username=credentials.get('username'), cookies=cookies)
+
+
 def require_login(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         self = args[0]
-        credentials = self.load_credentials()
-        cookies = self.load_cookies()
-        logged_in = self.logged_in(username=credentials.get('username'), cookies=cookies)
-        if not logged_in:
-            if not credentials:
-                click.confirm('A login is required.  Would you like to continue?', abort=True)
-                username, password = self.get_user_input_credentials()
-            else:
-                username, password = credentials['username'], credentials['password']
-
-            self.login(username, password)
-
-            logged_in = self.logged_in(username=username, cookies=cookies)
-            if not logged_in:
-                raise LoginUnsuccessful('Sorry, the username/password is not right.')
+        with tracing.span('verify login'):
+            _verify_login(self)
+        try:
+            return func(*args, **kwargs)
+        except NotLoggedIn:
+            # the session went stale after it was verified, so log in again and retry once
+            self.forget_login()
+            with tracing.span('verify login', retry=True):
+                _verify_login(self)
+            try:
+                return func(*args, **kwargs)
+            except NotLoggedIn as e:
+                raise LoginUnsuccessful(f'{e}')
 
-            # save the username and password (so we don't have to keep asking)
-            self.dump_credentials({'username': username, 'password': password})
+    return wrapper
 
-            # now save the cookies (so that we can remain logged in)
-            self.dump_cookies(self.session.cookies.get_dict())
 
-        r = func(*args, **kwargs)
+def retry_on_connection_error(func):
+    """ rever's retry on requests' ConnectionError, set up on the first call so requests is imported lazily """
+    retrying = None
 
-        return r
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal retrying
+        if retrying is None:
+            import requests
+            retrying = rever.rever(exception=(requests.exceptions.ConnectionError,))(func)
+        return retrying(*args, **kwargs)
 
     return wrapper
 
 
-@rever.rever(exception=(requests.exceptions.ConnectionError,))
+@retry_on_connection_error
 def post(session, url, data):
     return session.post(url, data=data)
 
 
+class RateLimiter(object):
+    """ Space out calls (from any thread) so there are at most `rate` per second. """
+
+    def __init__(self, rate: float = None):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
 class ProblemDoesNotExist(Exception):
     pass
 
@@ -84,28 +156,188 @@ class UnknownLoginError(Exception):
     pass
 
 
+class NotLoggedIn(Exception):
+    """ A request came back unauthenticated even though the session was verified. """
+    pass
+
+
+SIGN_IN_URL = 'https://projecteuler.net/sign_in'
+
+
 class Client(object):
     INHERENT_FIELDS = ('ID', 'Description / Title', 'Solved By', 'problem_url', 'page_url',)
     TEMPLATE_FIELDS = ('ID', 'Description / Title', 'problem_url', 'page_url', 'Problem',)
+    # seconds a cached page stays fresh before it is revalidated (None: never, problem statements don't change)
+    CACHE_TTLS = {'problem': None, 'archives': 10 * 60, 'home': 5 * 60}
+    # archive fields that change after a problem is published
+    VOLATILE_FIELDS = ('Solved By', 'Solved',)
+    ARCHIVE_PAGE_SIZE = 50
+    # seconds a verified login is trusted before projecteuler.net is asked again
+    LOGIN_TTL = 30 * 60
+    # ieuler-server: (connect, read) timeouts in seconds, retries on connection errors and 5xx, backoff in seconds
+    SERVER_TIMEOUT = (3.05, 30)
+    SERVER_RETRIES = 4
+    SERVER_BACKOFF = 0.25
+    SERVER_BACKOFF_MAX = 8
+    # problems per POST when syncing to the ieuler-server
+    SYNC_BATCH_SIZE = 100
 
     def __init__(self, cookies_filename='.cookies', credentials_filename='.credentials', problems_filename='.problems',
-                 default_language_filename='.default-language'):
-        self.session = requests_html.HTMLSession()
+                 default_language_filename='.default-language', cache_dirname='.cache', use_cache=True,
+                 login_state_filename='.login-state', storage=None, assets_dirname=None,
+                 sync_state_filename='.sync-state', search_index_filename='.search-index'):
+        self._session = None
+        self._server_session = None
+        self._server_reached = False
+        self._pulled = None
+        self._problems = None
+        self._language_template = None
+        self._prefetcher = None
+        self._prefetched = {}
+        self._prefetch_lock = threading.Lock()
         self.captcha = None
 
         self.cookies_filename = cookies_filename
         self.credentials_filename = credentials_filename
         self.problems_filename = problems_filename
         self.default_language_filename = default_language_filename
+        self.cache_dirname = cache_dirname
+        self.login_state_filename = login_state_filename
+        self.sync_state_filename = sync_state_filename
+        self.search_index = SearchIndex(search_index_filename)
 
-        self.problems = self.load_problems()
-        self.language_template = self.load_language_template() or Python()
+        self.storage = storage or os.getenv('IEULER_STORAGE') or 'sqlite'
+        self.store = get_store(self.storage, problems_filename)
+        if self.store is None:
+            raise Exception(f'Unknown storage {self.storage}.  Choose from: {supported_stores()}')
+
+        self.http_cache = HTTPCache(DiskCache(cache_dirname), self.CACHE_TTLS) if use_cache else None
+        self.asset_mirror = AssetMirror(assets_dirname)
 
         self.server_host = os.getenv('IEULER_SERVER_HOST') or '127.0.0.1'
         self.server_port = os.getenv('IEULER_SERVER_PORT') or 2718
         self.server_port = int(self.server_port)
 
-        self.session.cookies.update(self.load_cookies())
+        self.fetch_concurrency = int(os.getenv('IEULER_FETCH_CONCURRENCY') or 8)
+        self.fetch_rate = float(os.getenv('IEULER_FETCH_RATE') or 5)  # requests per second, 0 for no limit
+
+    # the session, problems and language are loaded on first use so commands only pay for what they touch
+    @property
+    def session(self):
+        if self._session is None:
+            with timings.timed('create http session'):
+                import requests_html
+
+                self._session = tracing.instrument(requests_html.HTMLSession())
+                self._session.cookies.update(self.load_cookies())
+        return self._session
+
+    @property
+    def server_session(self):
+        """ one pooled, keep-alive session for every ieuler-server call """
+        if self._server_session is None:
+            import requests
+
+            self._server_session = tracing.instrument(requests.Session())
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.fetch_concurrency)
+            self._server_session.mount('http://', adapter)
+            self._server_session.mount('https://', adapter)
+            self._server_session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        return self._server_session
+
+    @property
+    def problems(self) -> List:
+        if self._problems is None:
+            with timings.timed('load problems'), tracing.span('load problems') as span:
+                self._problems = self.load_problems()
+                span.set(problems=len(self._problems))
+        return self._problems
+
+    @problems.setter
+    def problems(self, problems: List):
+        self._problems = problems
+
+    @property
+    def language_template(self):
+        if self._language_template is None:
+            with timings.timed('load language'):
+                self._language_template = self.load_language_template() or Python()
+        return self._language_template
+
+    @language_template.setter
+    def language_template(self, language_template):
+        self._language_template = language_template
+
+    def disable_cache(self):
+        self.http_cache = None
+
+    def _cookies_key(self) -> str:
+        return json.dumps(self.session.cookies.get_dict(), sort_keys=True)
+
+    def _get(self, url: str, url_class: str = None, per_user: bool = False):
+        """ GET a url, going through the response cache when the url class is cacheable """
+        with tracing.span('get page', url=url, url_class=url_class):
+            return self._take(url, self._get_now, url, url_class, per_user)
+
+    def _get_now(self, url: str, url_class: str = None, per_user: bool = False):
+        if self.http_cache is None or url_class is None:
+            return self.session.get(url)
+        return self.http_cache.get(self.session, url, url_class, vary=self._cookies_key() if per_user else '')
+
+    # requests that don't depend on the user's input are started ahead of time, while they read a prompt
+    def _prefetch(self, key: str, func, *args) -> Future:
+        with self._prefetch_lock:
+            if key not in self._prefetched:
+                if self._prefetcher is None:
+                    self._prefetcher = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch')
+                self._prefetched[key] = self._prefetcher.submit(func, *args)
+            return self._prefetched[key]
+
+    def _take(self, key: str, func, *args):
+        """ the result of the prefetched key (each is used once), or of calling func now if there is none """
+        with self._prefetch_lock:
+            future = self._prefetched.pop(key, None)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # try again in the foreground, where errors are handled as usual
+        return func(*args)
+
+    def _forget_prefetched(self):
+        with self._prefetch_lock:
+            self._prefetched.clear()
+
+    def prefetch(self, url: str, url_class: str = None, per_user: bool = False) -> Future:
+        """ start GETting url in the background, the next _get of it waits for this response instead """
+        return self._prefetch(url, self._get_now, url, url_class, per_user)
+
+    def prefetch_login(self, captcha: bool = True):
+        """ fetch the sign in form (for its CSRF token) and a captcha, together, before they are needed """
+        if self.session.cookies.get_dict():
+            self._prefetch(SIGN_IN_URL, self.session.get, SIGN_IN_URL)
+            if captcha:
+                self._prefetch('captcha', self.get_captcha_raw)
+        else:
+            # the captcha belongs to the session, so wait for the sign in page to start one
+            sign_in = self._prefetch(SIGN_IN_URL, self.session.get, SIGN_IN_URL)
+            def get_captcha_after_sign_in():
+                sign_in.exception()  # wait for it, whether or not it worked
+                return self.get_captcha_raw()
+
+            if captcha:
+                self._prefetch('captcha', get_captcha_after_sign_in)
+
+    def prefetch_submit(self, number: int):
+        """ fetch a problem's answer form (and check the login) while its solution is still running """
+        self.prefetch(f'https://projecteuler.net/problem={number}')
+        credentials = self.load_credentials()
+        if not self.login_verified(username=credentials.get('username'), cookies=self.load_cookies()):
+            self.prefetch('https://projecteuler.net', 'home', per_user=True)
+
+    def _forget(self, url: str, per_user: bool = False):
+        if self.http_cache is not None:
+            self.http_cache.forget(url, vary=self._cookies_key() if per_user else '')
 
     def load_language_template(self):
         try:
@@ -137,11 +369,13 @@ class Client(object):
             json.dump(cookies, f)
 
     def load_problems(self):
-        try:
-            with open(self.problems_filename, 'rt') as f:
-                return json.load(f)
-        except (json.decoder.JSONDecodeError, FileNotFoundError):
-            return []
+        return self.store.load()
+
+    def has_problems(self) -> bool:
+        """ whether any problems are stored, without loading them when they aren't loaded yet """
+        if self._problems is not None:
+            return bool(self._problems)
+        return self.store.count() > 0
 
     def load_credentials(self):
         try:
@@ -154,12 +388,54 @@ class Client(object):
         with open(self.credentials_filename, 'wt') as f:
             json.dump(credentials, f)
 
+    def load_login_state(self) -> Dict:
+        try:
+            with open(self.login_state_filename, 'rt') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def dump_login_state(self, login_state: Dict):
+        with open(self.login_state_filename, 'wt') as f:
+            json.dump(login_state, f)
+
+    @staticmethod
+    def get_cookie_jar_key(cookies: Dict) -> str:
+        return hashlib.sha256(json.dumps(cookies or {}, sort_keys=True).encode()).hexdigest()
+
+    def login_verified(self, username: str = None, cookies: Dict = None) -> bool:
+        """ whether this cookie jar was recently verified as logged in (as username), so we can skip checking """
+        login_state = self.load_login_state()
+        if not cookies or login_state.get('cookies') != self.get_cookie_jar_key(cookies):
+            return False
+        if username and login_state.get('username') != username:
+            return False
+        now = time.time()
+        if now - login_state.get('verified_at', 0) > self.LOGIN_TTL:
+            return False
+        if login_state.get('expires') and now >= login_state['expires']:
+            return False
+        return True
+
+    def remember_login(self, username: str = None, cookies: Dict = None):
+        expires = [_.expires for _ in self.session.cookies if _.expires]
+        self.dump_login_state({'username': username,
+                               'cookies': self.get_cookie_jar_key(cookies),
+                               'verified_at': time.time(),
+                               'expires': min(expires) if expires else None})
+
+    def forget_login(self):
+        self.dump_login_state({})
+        self._forget_prefetched()
+        self._forget('https://projecteuler.net', per_user=True)
+
+    @tracing.traced('home page check')
     def logged_in(self, username: str = None, cookies: Dict = None):
 
         if cookies:
             self.session.cookies.update(cookies)
 
-        r0 = self.session.get('https://projecteuler.net')
+        r0 = self._get('https://projecteuler.net', 'home', per_user=True)
         # check user is logged in as username
         info = r0.html.find('#info_panel', first=True)
         name = info.find('strong', first=True)
@@ -174,22 +450,25 @@ class Client(object):
         else:
             return False
 
-    @rever.rever(exception=(requests.exceptions.ConnectionError,))
+    @retry_on_connection_error
     def logout(self):
-        r0 = self.session.get('https://projecteuler.net')
+        self.forget_login()
+        r0 = self._get('https://projecteuler.net', 'home', per_user=True)
+        self._forget('https://projecteuler.net', per_user=True)
         for _ in r0.html.find('a'):
             if _.attrs.get('title') == 'Sign Out':
                 self.session.get(f'https://projecteuler.net/{_.attrs["href"]}')
 
-    @rever.rever(exception=(requests.exceptions.ConnectionError,))
+    @retry_on_connection_error
     def get_captcha_raw(self) -> bytes:
         captcha_url = f'https://projecteuler.net/captcha/show_captcha.php?{random.random()}'
         r2 = self.session.get(captcha_url)
         return r2.content
 
     def get_user_input_captcha(self):
+        self.prefetch_login()
         click.confirm('A captcha is required.  Would you like to continue?', abort=True)
-        self.captcha = Captcha(self.get_captcha_raw())
+        self.captcha = Captcha(self._take('captcha', self.get_captcha_raw))
         self.captcha.show_in_terminal()
         return self.captcha.input
 
@@ -199,16 +478,20 @@ class Client(object):
         password = click.prompt('Please enter your Project Euler password', type=str, hide_input=True)
         return username, password
 
+    @tracing.traced('login')
     def login(self, username: str, password: str, captcha: Union[str, int] = None):
+        self.prefetch_login(captcha=not captcha)
         if not captcha:
             captcha = self.get_user_input_captcha()
-        r0 = self.session.get('https://projecteuler.net/sign_in')
+        r0 = self._take(SIGN_IN_URL, self.session.get, SIGN_IN_URL)
         csrf = r0.html.find('form[name="sign_in_form"]>[name="csrf_token"]', first=True).attrs['value']
         r = post(self.session, 'https://projecteuler.net/sign_in', {'username': username,
                                                                     'password': password,
                                                                     'captcha': captcha,
                                                                     'sign_in': 'Sign In',
                                                                     'csrf_token': csrf})
+        self._forget('https://projecteuler.net', per_user=True)
+        self._forget_prefetched()  # anything fetched before signing in saw the signed out site
 
         if r.url != 'https://projecteuler.net/archives':
             warning = r.html.find('[class="warning"]', first=True)
@@ -225,12 +508,15 @@ class Client(object):
                 raise UnknownLoginError('Unable to locate error logging in - investigate.')
 
     @require_login
+    @tracing.traced('submit answer')
     def submit(self, number, answer, captcha: Union[str, int] = None):
 
         # it is possible you already solved this problem
 
-        r = self.session.get(f'https://projecteuler.net/problem={number}')
+        r = self._get(f'https://projecteuler.net/problem={number}')
         form_e = r.html.find('form[name="form"]', first=True)
+        if not form_e:
+            raise NotLoggedIn(f'Project Euler did not show the answer form for problem {number}.  Are you logged in?')
         completed = form_e.text
         if 'Completed' in completed:
             # note don't include keys we don't want updated so they don't update good data
@@ -271,17 +557,14 @@ class Client(object):
 
     def get_problem_details(self, number: int) -> Dict:
         url = f'https://projecteuler.net/problem={number}'
-        r = self.session.get(url)
+        r = self._get(url, 'problem')
         if r.url != url:
             raise ProblemDoesNotExist(f'Problem {number} does not exist')
 
-        problem_info = r.html.find('h2', first=True).text  # only one h2 element
-        problem_content = r.html.find('.problem_content', first=True).html
-        for _ in ('<img src="', '<a href="'):
-            st = problem_content.find(_)
-            if st > -1:
-                problem_content = problem_content[:st + len(_)] + 'https://projecteuler.com/' + problem_content[
-                                                                                                st + len(_):]
+        with tracing.span('parse problem'):
+            problem_info, problem_content = parse_problem_page(r.content)
+        # make every relative image/link absolute so the statement works outside of projecteuler.net
+        problem_content = re.sub(r'((?:src|href)=")(?![a-z]+:|#)/?', r'\1https://projecteuler.net/', problem_content)
         return {
             'ID': int(number),
             'Description / Title': problem_info,
@@ -290,59 +573,20 @@ class Client(object):
         }
 
     def get_problem_list_on_page(self, page: int) -> List:
-        data = []
         if page == 1:
             url = 'https://projecteuler.net/archives'
         else:
             url = f'https://projecteuler.net/archives;page={page}'
 
-        r = self.session.get(url)
-
-        column_headers = []  # id, desc, solved_by, difficulty, solved
-        for i, tr in enumerate(r.html.find('tr')):
-            if not tr.find('.id_column'):
-                continue
-
-            row = {_: None for _ in column_headers}
-            if i == 0:
-                for th in tr.find('th'):
-                    if th.text:
-                        column_headers.append(th.text)
-                continue
-
-            for j, td in enumerate(tr.find('td')):
-
-                if j < len(column_headers):
-                    row[column_headers[j]] = td.text
-
-                else:
-                    img = td.find('img', first=True)
-                    if img:
-                        if img.attrs['title'] == 'Solved':
-                            row['Solved'] = True
-                            break
-                    row['Solved'] = False
-                    break
-
-            row.update({'problem_url': f'https://projecteuler.net/problem={row["ID"]}'})
-            row.update({'page_url': url})
-            row.update({'ID': int(row['ID'])})
-            data.append(row)
-
-        return data
+        r = self._get(url, 'archives', per_user=True)
+        with tracing.span('parse archives'):
+            return parse_archive_page(r.content, url)
 
     def get_page_qty(self) -> int:
         url = 'https://projecteuler.net/archives'
-        r = self.session.get(url)
-
-        pages = 15
-        for a in reversed(r.html.find('a')):
-            href = a.attrs['href']
-            s = re.search(r'=([0-9]*)$', href)
-            if s:
-                pages = int(s.group(1))
-                break
-        return pages
+        r = self._get(url, 'archives', per_user=True)
+        with tracing.span('parse page count'):
+            return parse_page_qty(r.content, default=15)
 
     @staticmethod
     def get_page_number_from_page_url(page_url: str):
@@ -352,66 +596,256 @@ class Client(object):
         return 1
 
     def update_problems(self, problems: List):
+        searchable = []
         for _ in problems:
             if int(_['ID']) <= len(self.problems):
                 self.problems[int(_['ID']) - 1].update(_)
             else:
                 self.problems.append(_)  # todo what if the problems are not sorted or there is a gap?
+            if any(k in _ for k in SEARCH_FIELDS):
+                searchable.append(self.problems[int(_['ID']) - 1] if int(_['ID']) <= len(self.problems) else _)
 
         try:
-            with open(self.problems_filename, 'wt') as f:
-                json.dump(self.problems, f)
+            with tracing.span('store upsert', rows=len(problems)):
+                self.store.upsert(problems)
         except TypeError as e:
             raise Exception(f'Problems not updated properly: {e}')
 
-    def get_new_problems(self) -> List:
-        """ get any new problems from Project Euler """
-        last_problem_number = int(self.problems[-1]['ID'])
-        i = 1
-        new_problems = []
-        while True:
+        if searchable:
+            # the problems are stored, a search index that can't keep up shouldn't fail the command
             try:
-                new_problems.append(self.get_problem_details(number=last_problem_number + i))
-                i += 1
-            except ProblemDoesNotExist:
-                break
-        return new_problems
+                with tracing.span('search index', problems=len(searchable)) as span:
+                    span.set(indexed=self.search_index.update(searchable))
+            except (SearchUnavailable, sqlite3.Error) as e:
+                warnings.warn(f'The search index was not updated: {e}')
+
+    def fetch_concurrently(self, func, items, concurrency: int = None, label: str = None, errors: Dict = None) -> Dict:
+        """ call func on each item from a pool of at most `concurrency` threads, returning {item: result}
+
+        Given an errors dict, an item whose call raises gets its exception there instead of stopping the rest.
+        """
+        concurrency = max(1, concurrency or self.fetch_concurrency)
+        items = list(items)
+        results = {}
+        if not items:
+            return results
+        with click.progressbar(length=len(items), label=label) if label else contextlib.nullcontext() as bar:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+                futures = {executor.submit(func, _): _ for _ in items}
+                for future in as_completed(futures):
+                    if errors is not None and future.exception() is not None:
+                        errors[futures[future]] = future.exception()
+                    else:
+                        results[futures[future]] = future.result()
+                    if bar:
+                        bar.update(1)
+        return results
+
+    def get_new_problems(self, concurrency: int = None) -> List:
+        """ get any new problems from Project Euler """
+        last_problem_number = int(self.problems[-1]['ID']) if self.problems else 0
+        numbers = range(last_problem_number + 1, int(self.get_last_problem()['ID']) + 1)
+        details = self.fetch_concurrently(lambda _: self.get_problem_details(number=_), numbers, concurrency)
+        return [details[_] for _ in numbers]
 
     def get_last_problem(self) -> Dict:
         last_page = self.get_page_qty()
         problems = self.get_problem_list_on_page(page=last_page)
         return problems[-1]
 
-    def get_all_problems(self) -> List:
-        all_problems = []
-        with click.progressbar(range(1, self.get_page_qty() + 1), label='Fetching problems from Project Euler.') as bar:
-            for page in bar:
-                all_problems.extend(self.get_problem_list_on_page(page=page))
-        return all_problems
+    def get_all_problems(self, concurrency: int = None) -> List:
+        """ get the archive pages concurrently, at most `concurrency` at a time, merged in ID order """
+        pages = range(1, self.get_page_qty() + 1)
+        problems_by_page = self.fetch_concurrently(lambda _: self.get_problem_list_on_page(page=_), pages,
+                                                   concurrency, label='Fetching problems from Project Euler.')
 
-    def update_all_problems(self) -> None:
-        all_problems = self.get_all_problems()
+        all_problems = [problem for page in pages for problem in problems_by_page[page]]
+        return sorted(all_problems, key=lambda _: int(_['ID']))
+
+    def update_all_problems(self, concurrency: int = None) -> None:
+        all_problems = self.get_all_problems(concurrency=concurrency)
         self.update_problems(all_problems)
 
+    def prefetch_problems(self, numbers: List[int], concurrency: int = None, rate: float = None,
+                          errors: Dict = None) -> List:
+        """ get the details of many problems concurrently (at most `rate` requests a second) and store them at once
+
+        The problems that could be fetched are stored even if others failed.  Their errors go in `errors` ({number:
+        exception}) when it is given, otherwise the first is raised after storing.
+        """
+        limiter = RateLimiter(self.fetch_rate if rate is None else rate)
+
+        def get_problem_details(number):
+            limiter.wait()
+            return self.get_problem_details(number=number)
+
+        failed = {} if errors is None else errors
+        details = self.fetch_concurrently(get_problem_details, numbers, concurrency,
+                                          label='Fetching problem details from Project Euler.', errors=failed)
+        problems = [details[_] for _ in numbers if _ in details]
+        self.update_problems(problems)
+        if failed and errors is None:
+            raise failed[min(failed)]
+        return problems
+
+    def mirror_assets(self, problems: List[Dict], concurrency: int = None, rate: float = None) -> List:
+        """ download the images and data files the problems link to and point the problems at the local copies """
+        limiter = RateLimiter(self.fetch_rate if rate is None else rate)
+        urls = sorted({url for _ in problems for url in find_asset_urls(_.get('Problem')) + list(_.get('assets', {}))})
+        paths = self.asset_mirror.paths(urls)
+
+        def download(url):
+            limiter.wait()
+            r = self.session.get(url)
+            if r.status_code == 200:
+                return self.asset_mirror.add(url, r.content)
+
+        downloaded = self.fetch_concurrently(download, [_ for _ in urls if _ not in paths], concurrency,
+                                             label='Mirroring problem assets.')
+        downloaded = {url: path for url, path in downloaded.items() if path}
+        if downloaded:
+            self.asset_mirror.update_index(downloaded)
+            paths.update(downloaded)
+
+        updates = []
+        for problem in problems:
+            problem_content = problem.get('Problem')
+            assets = dict(problem.get('assets', {}))
+            for url in find_asset_urls(problem_content) + list(assets):
+                if url not in paths:
+                    continue
+                for old in {url, assets.get(url)} - {None}:
+                    problem_content = problem_content.replace(f'"{old}"', f'"{paths[url]}"')
+                assets[url] = paths[url]
+            if assets:
+                updates.append({'ID': problem['ID'], 'Problem': problem_content, 'assets': assets})
+        self.update_problems(updates)
+        return updates
+
+    def sync_problems(self, concurrency: int = None) -> List:
+        """ bring the stored problems up to date by reading only the archive pages past what we already have
+
+        Known problems only get their volatile fields refreshed, so stored code and details are left alone.
+        Returns the new problems.
+        """
+        last_problem_number = int(self.problems[-1]['ID']) if self.problems else 0
+        page_qty = self.get_page_qty()
+        first_page = min(last_problem_number // self.ARCHIVE_PAGE_SIZE + 1, page_qty)
+
+        rows_by_page = {page_qty: self.get_problem_list_on_page(page=page_qty)}
+        rows_by_page.update(self.fetch_concurrently(lambda _: self.get_problem_list_on_page(page=_),
+                                                    range(first_page, page_qty), concurrency))
+        rows = sorted((_ for page in rows_by_page.values() for _ in page), key=lambda _: int(_['ID']))
+
+        new_rows = [_ for _ in rows if int(_['ID']) > last_problem_number]
+        details = self.fetch_concurrently(lambda _: self.get_problem_details(number=_),
+                                          [int(_['ID']) for _ in new_rows], concurrency)
+
+        updates = []
+        for row in rows:
+            number = int(row['ID'])
+            if number in details:
+                updates.append(dict(row, **details[number]))
+            else:
+                updates.append({_: row[_] for _ in ('ID',) + self.VOLATILE_FIELDS if _ in row})
+        self.update_problems(updates)
+        return [_ for _ in updates if int(_['ID']) > last_problem_number]
+
+    def request_ipe(self, method: str, path: str = '', retries: int = None, timeout=None, **kwargs):
+        """ call the ieuler-server, retrying connection errors, timeouts and 5xx with jittered exponential backoff """
+        url = f'http://{self.server_host}:{self.server_port}{path}'
+        retries = self.SERVER_RETRIES if retries is None else retries
+        with tracing.span(f'ieuler-server {method} {path or "/"}') as span:
+            return self._request_ipe(span, method, url, retries, timeout, **kwargs)
+
+    def _request_ipe(self, span, method: str, url: str, retries: int, timeout, **kwargs):
+        import requests
+
+        for attempt in range(retries + 1):
+            span.set(attempts=attempt + 1)
+            try:
+                r = self.server_session.request(method, url, timeout=timeout or self.SERVER_TIMEOUT, **kwargs)
+                self._server_reached = True
+                if r.status_code < 500 or attempt == retries:
+                    return r
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # a server that never answered is most likely not running, say so now rather than after the backoff
+                if attempt == retries or not self._server_reached:
+                    raise
+            time.sleep(random.uniform(0, min(self.SERVER_BACKOFF_MAX, self.SERVER_BACKOFF * 2 ** attempt)))
+
     def ping_ipe(self):
-        r = requests.get(f'http://{self.server_host}:{self.server_port}')
+        import requests
+
+        # a server that isn't running should be noticed straight away, so no retries here
+        try:
+            self.request_ipe('GET', retries=0, timeout=(1, 5))
+        except requests.exceptions.Timeout as e:
+            raise requests.exceptions.ConnectionError(e)
+
+    def check_ipe(self):
+        """ ping the server before a login would be checked, once the login is trusted the sync itself finds out """
+        credentials = self.load_credentials()
+        if not self.login_verified(username=credentials.get('username'), cookies=self.load_cookies()):
+            self.ping_ipe()
+
+    def sync_state(self) -> SyncState:
+        return SyncState(self.sync_state_filename, f'{self.server_host}:{self.server_port}',
+                         self.load_credentials().get('username'))
 
     @require_login
-    def get_from_ipe(self):
+    @tracing.traced('sync from server')
+    def get_from_ipe(self, full: bool = False):
+        """ the server's problems that differ from what we last synced (with a cursor, only those changed since) """
         username = self.load_credentials()['username']
         cookies = self.load_cookies()
         url = f'http://{self.server_host}:{self.server_port}/api/problems'
-        r = requests.get(url, auth=(username, json.dumps(cookies)))
+        state = self.sync_state()
+        params = {'since': state.cursor} if state.cursor and not full else None
+        r = self.request_ipe('GET', '/api/problems', params=params, headers={'X-Ieuler-Sync': str(SYNC_VERSION)},
+                             auth=(username, json.dumps(cookies)))
         if r.status_code == 401:
-            raise LoginUnsuccessful(f'Unable to login to ieuler-server: {url}')
-        return r.json()
+            raise NotLoggedIn(f'Unable to login to ieuler-server: {url}')
+        self._pulled = (r.headers.get('X-Ieuler-Cursor'), int(r.headers.get('X-Ieuler-Sync') or 0))
+        problems = r.json()
+        if full:
+            return problems
+        return [_ for _ in problems if sync_payload(_) is None or state.changed([sync_payload(_)])]
+
+    def ack_pulled(self, problems: List):
+        """ after problems from get_from_ipe are merged: the server and we agree on them, move the cursor past them """
+        cursor, version = self._pulled or (None, None)
+        numbers = {int(_['ID']) for _ in problems}
+        merged = [sync_payload(_) for _ in self.problems if int(_['ID']) in numbers]
+        self.sync_state().ack([_ for _ in merged if _], cursor=cursor, version=version)
+        self._pulled = None
 
     @require_login
     def send_to_ipe(self, data):
         username = self.load_credentials()['username']
         cookies = self.load_cookies()
         url = f'http://{self.server_host}:{self.server_port}/api/problems'
-        r = requests.post(url, json=data, auth=(username, json.dumps(cookies)))
+        state = self.sync_state()
+        body = json.dumps(data).encode()
+        headers = {'Content-Type': 'application/json', 'X-Ieuler-Sync': str(SYNC_VERSION)}
+        if state.version:  # it speaks the sync protocol, which takes gzipped bodies
+            body, headers['Content-Encoding'] = gzip.compress(body), 'gzip'
+        # the server upserts what it is sent, so a retried POST does no harm
+        r = self.request_ipe('POST', '/api/problems', data=body, headers=headers, auth=(username, json.dumps(cookies)))
+        if r.status_code == 415 and 'Content-Encoding' in headers:
+            state.ack([], version=0)
+            return self.send_to_ipe(data)
         if r.status_code == 401:
-            raise LoginUnsuccessful(f'Unable to login to ieuler-server: {url}')
+            raise NotLoggedIn(f'Unable to login to ieuler-server: {url}')
+        if r.ok:
+            state.ack([_ for _ in map(sync_payload, data) if _], version=int(r.headers.get('X-Ieuler-Sync') or 0))
         return r.json()
+
+    def sync_to_ipe(self, problems: List, full: bool = False) -> List:
+        """ send the problems whose code or solve state changed since the server last acknowledged them, in batches """
+        payloads = [_ for _ in map(sync_payload, problems) if _]
+        if not full:
+            payloads = self.sync_state().changed(payloads)
+        with tracing.span('sync to server', problems=len(payloads)):
+            return [self.send_to_ipe(payloads[_:_ + self.SYNC_BATCH_SIZE])
+                for _ in range(0, len(payloads), self.SYNC_BATCH_SIZE)]
@@ -0,0 +1,164 @@
+""" A stand-in for the ieuler-server, for trying out and load testing sync without a real one.
+
+It serves /api/problems with the same basic auth (username, json cookies) and speaks the delta sync protocol
+(see ieuler.sync): gzipped bodies, the X-Ieuler-Sync header and a since=<cursor> change log.  Problems are kept in
+memory, per user.  Run it with `python -m ieuler.devserver [PORT]` and point ilr at it with `ilr config -port PORT`.
+"""
+import base64
+import gzip
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+from ieuler.sync import SYNC_VERSION
+
+
+class StandInServer(object):
+    """ The stand-in, served from a background thread.  users maps username to the cookies it must send, if given. """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, users: Dict[str, Dict] = None, sync: bool = True):
+        self.users = users
+        self.sync = sync  # False: behave like a server that predates delta sync
+        self.problems = {}  # username: {ID: problem}
+        self.changes = {}  # username: [ID, ...], the cursor is an index into it
+        self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def authenticate(self, authorization: str):
+        """ the username of a basic auth header, or None if it doesn't log in """
+        if not authorization or not authorization.startswith('Basic '):
+            return None
+        try:
+            username, _, cookies = base64.b64decode(authorization[6:]).decode().partition(':')
+            cookies = json.loads(cookies)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not username or not cookies:
+            return None
+        if self.users is not None and self.users.get(username) != cookies:
+            return None
+        return username
+
+    def get(self, username: str, since: str = None):
+        with self._lock:
+            problems, changes = self.problems.get(username, {}), self.changes.get(username, [])
+            if self.sync and since is not None and since.isdigit() and int(since) <= len(changes):
+                numbers = sorted(set(changes[int(since):]))
+            else:
+                numbers = sorted(problems)
+            return [problems[_] for _ in numbers], str(len(changes))
+
+    def upsert(self, username: str, problems):
+        changed = 0
+        with self._lock:
+            stored, changes = self.problems.setdefault(username, {}), self.changes.setdefault(username, [])
+            for problem in problems:
+                number = int(problem['ID'])
+                merged = dict(stored.get(number, {}), **problem)
+                if merged != stored.get(number):
+                    stored[number] = merged
+                    changes.append(number)
+                    changed += 1
+        return {'received': len(problems), 'changed': changed}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def reply(self, status: int, body, headers: Dict = None):
+                content = json.dumps(body).encode()
+                headers = dict(headers or {})
+                if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    content, headers['Content-Encoding'] = gzip.compress(content), 'gzip'
+                if server.sync and self.headers.get('X-Ieuler-Sync'):
+                    headers['X-Ieuler-Sync'] = str(SYNC_VERSION)
+                # counted before the client can have the response, so stats read after a call include it
+                with server._lock:
+                    server.stats['requests'] += 1
+                    server.stats['bytes_out'] += len(content)
+                self.send_response(status)
+                for k, v in dict(headers, **{'Content-Type': 'application/json',
+                                             'Content-Length': str(len(content))}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path in ('', '/'):
+                    return self.reply(200, {'ok': True})
+                if url.path != '/api/problems':
+                    return self.reply(404, {'error': 'not found'})
+                username = server.authenticate(self.headers.get('Authorization'))
+                if not username:
+                    return self.reply(401, {'error': 'not logged in'})
+                since = parse_qs(url.query).get('since', [None])[0]
+                problems, cursor = server.get(username, since)
+                self.reply(200, problems, {'X-Ieuler-Cursor': cursor} if server.sync else None)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with server._lock:
+                    server.stats['bytes_in'] += len(body)
+                if urlparse(self.path).path != '/api/problems':
+                    return self.reply(404, {'error': 'not found'})
+                username = server.authenticate(self.headers.get('Authorization'))
+                if not username:
+                    return self.reply(401, {'error': 'not logged in'})
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    if not server.sync:
+                        return self.reply(415, {'error': 'gzip bodies are not supported'})
+                    body = gzip.decompress(body)
+                self.reply(200, server.upsert(username, json.loads(body or b'[]')))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    # python -m ieuler.devserver [PORT]
+    with StandInServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 2718) as stand_in:
+        print(f'ieuler-server stand-in on http://{stand_in.host}:{stand_in.port}, ctrl-c to stop')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,197 @@
+""" A warm runner for Python solutions.
+
+The server imports the modules solutions commonly use once, then forks a fresh child for every run, so a run only
+pays for the solution itself.  Start it with `ilr runner start -preload numpy,sympy` (or run this module directly).
+"""
+import importlib
+import os
+import runpy
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+from typing import Callable, List
+
+from ieuler.runner import ONE_MINUTE, Limits, RunResult, watch
+
+DEFAULT_ADDRESS = '.runner.sock'
+
+
+def _run_child(filename: str, cwd: str, limits: Limits, stdout_fd: int, stderr_fd: int):
+    """ in the forked child: become `python3 filename` as closely as we can and never return """
+    code = 0
+    try:
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.chdir(cwd)
+        if limits:
+            limits.apply()
+        sys.argv = [filename]
+        sys.path[0] = os.path.dirname(os.path.abspath(filename))
+        runpy.run_path(filename, run_name='__main__')
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _handle(connection, request):
+    filename, cwd = request['filename'], request['cwd']
+    limits = Limits(**request['limits']) if request.get('limits') else None
+    stream = request.get('stream')
+    command = [sys.executable, filename]
+
+    start = time.perf_counter()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        os.close(stdout_r)
+        os.close(stderr_r)
+        _run_child(filename, cwd, limits, stdout_w, stderr_w)
+    os.close(stdout_w)
+    os.close(stderr_w)
+
+    lock = threading.Lock()
+    cancel = threading.Event()
+    finished = threading.Event()
+
+    def send(name):
+        def _send(line):
+            if stream:
+                with lock:
+                    connection.send((name, line))
+        return _send
+
+    def listen_for_cancel():
+        while not finished.is_set():
+            try:
+                if connection.poll(0.05):
+                    connection.recv()
+                    cancel.set()
+                    return
+            except (OSError, EOFError):
+                cancel.set()  # the caller went away, nobody wants this run anymore
+                return
+
+    listener = threading.Thread(target=listen_for_cancel)
+    listener.start()
+    try:
+        result = watch(command, pid, os.fdopen(stdout_r, 'rb'), os.fdopen(stderr_r, 'rb'),
+                       timeout=request.get('timeout', ONE_MINUTE), limits=limits,
+                       on_stdout=send('stdout'), on_stderr=send('stderr'), cancel=cancel, start=start)
+    finally:
+        finished.set()
+        listener.join()
+    connection.send(('result', dict(result.as_dict(), stdout=result.stdout, stderr=result.stderr)))
+
+
+def serve(address: str = DEFAULT_ADDRESS, preload: List[str] = ()):
+    """ preload modules then run solutions on request, one at a time, until asked to stop """
+    for module in preload:
+        importlib.import_module(module)
+
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, family='AF_UNIX') as listener:
+        os.chmod(address, 0o600)
+        while True:
+            with listener.accept() as connection:
+                try:
+                    request = connection.recv()
+                    if request.get('action') == 'stop':
+                        connection.send(('stopped', None))
+                        return
+                    if request.get('action') == 'status':
+                        connection.send(('status', {'pid': os.getpid(), 'python': sys.version.split()[0],
+                                                    'preload': list(preload)}))
+                        continue
+                    try:
+                        _handle(connection, request)
+                    except (OSError, EOFError):
+                        raise
+                    except Exception as e:
+                        connection.send(('error', f'{e}'))
+                except (OSError, EOFError):
+                    continue  # the caller went away (eg ctrl-c), carry on serving
+
+
+def _request(address: str, request: dict, on_message: Callable = None, cancel: threading.Event = None):
+    with Client(address, family='AF_UNIX') as connection:
+        connection.send(request)
+        done = threading.Event()
+
+        def forward_cancel():
+            while not done.wait(0.05):
+                if cancel.is_set():
+                    connection.send({'action': 'cancel'})
+                    return
+
+        if cancel is not None:
+            threading.Thread(target=forward_cancel, daemon=True).start()
+        try:
+            while True:
+                kind, message = connection.recv()
+                if kind in ('stdout', 'stderr'):
+                    if on_message:
+                        on_message(kind, message)
+                    continue
+                if kind == 'error':
+                    raise RuntimeError(message)
+                return message
+        finally:
+            done.set()
+
+
+def available(address: str = DEFAULT_ADDRESS) -> bool:
+    return status(address) is not None
+
+
+def status(address: str = DEFAULT_ADDRESS):
+    if not os.path.exists(address):
+        return None
+    try:
+        return _request(address, {'action': 'status'})
+    except (OSError, EOFError):
+        return None
+
+
+def stop(address: str = DEFAULT_ADDRESS):
+    try:
+        _request(address, {'action': 'stop'})
+    except (OSError, EOFError):
+        pass
+
+
+def run(filename: str, timeout: float = ONE_MINUTE, cwd: str = None, limits: Limits = None,
+        on_stdout: Callable[[bytes], None] = None, on_stderr: Callable[[bytes], None] = None,
+        cancel: threading.Event = None, address: str = DEFAULT_ADDRESS) -> RunResult:
+    """ like ieuler.runner.run([python3, filename]), but in a child forked from the warm server at address """
+    callbacks = {'stdout': on_stdout, 'stderr': on_stderr}
+
+    def on_message(kind, line):
+        if callbacks[kind]:
+            callbacks[kind](line)
+
+    request = {'filename': filename, 'cwd': os.path.abspath(cwd or os.getcwd()), 'timeout': timeout,
+               'limits': vars(limits) if limits else None, 'stream': bool(on_stdout or on_stderr)}
+    result = _request(address, request, on_message, cancel)
+    return RunResult(**result)
+
+
+if __name__ == '__main__':
+    # python -m ieuler.forkserver [ADDRESS] [MODULE,MODULE...]
+    serve(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ADDRESS,
+          [_ for _ in (sys.argv[2] if len(sys.argv) > 2 else '').split(',') if _])
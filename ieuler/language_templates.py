@@ -10,13 +10,29 @@ def supported_languages():
 
 
 class Template(object):
-    def __init__(self, language, extension):
+    def __init__(self, language, extension, compiler=None, flags=()):
         self.language = language
         self.extension = extension
+        self.compiler = compiler  # None for interpreted languages
+        self.flags = flags
 
     def template(self, content):
         pass
 
+    def command(self, filename):
+        """ what to execute to run filename (compiled languages are built first, or taken from the build cache) """
+        if self.compiler is None:
+            return [self.language, filename]
+
+        from ieuler.build import BuildCache
+        return [BuildCache().build(self, filename)]
+
+    def build_command(self, source, binary):
+        return [self.compiler, *self.flags, '-o', binary, source]
+
+    def version_command(self):
+        return [self.compiler or self.language, '--version']
+
 
 class Python(Template):
     def __init__(self):
@@ -48,3 +64,44 @@ class PHP(Template):
 
     def template(self, content):
         return f'<?php\n/*\n{content}\n\n*/\n\n\nfunction answer() {{\n    // Solve the problem here! Make sure to return the answer.\n    return 0;\n}}\n\n\n# Below is OK to leave alone\necho answer();\n?>'
+
+
+class C(Template):
+    def __init__(self):
+        super().__init__(language='c', extension='.c', compiler='cc', flags=('-O2', '-std=c11'))
+
+    def build_command(self, source, binary):
+        return super().build_command(source, binary) + ['-lm']
+
+    def template(self, content):
+        return f'/*{content}\n\n*/\n\n#include <stdio.h>\n\n\nlong long answer(void) {{\n    // Solve the problem here! Make sure to return the answer.\n    return 0;\n}}\n\n\n// Below is OK to leave alone\nint main(void) {{\n    printf("%lld\\n", answer());\n    return 0;\n}}\n'
+
+
+class Cpp(Template):
+    def __init__(self):
+        super().__init__(language='cpp', extension='.cpp', compiler='c++', flags=('-O2', '-std=c++17'))
+
+    def template(self, content):
+        return f'/*{content}\n\n*/\n\n#include <iostream>\n\n\nlong long answer() {{\n    // Solve the problem here! Make sure to return the answer.\n    return 0;\n}}\n\n\n// Below is OK to leave alone\nint main() {{\n    std::cout << answer() << std::endl;\n    return 0;\n}}\n'
+
+
+class Rust(Template):
+    def __init__(self):
+        super().__init__(language='rust', extension='.rs', compiler='rustc', flags=('-O', '--edition', '2021'))
+
+    def template(self, content):
+        return f'/*{content}\n\n*/\n\n\nfn answer() -> u64 {{\n    // Solve the problem here! Make sure to return the answer.\n    0\n}}\n\n\n// Below is OK to leave alone\nfn main() {{\n    println!("{{}}", answer());\n}}\n'
+
+
+class Go(Template):
+    def __init__(self):
+        super().__init__(language='go', extension='.go', compiler='go')
+
+    def build_command(self, source, binary):
+        return [self.compiler, 'build', *self.flags, '-o', binary, source]
+
+    def version_command(self):
+        return [self.compiler, 'version']
+
+    def template(self, content):
+        return f'/*{content}\n\n*/\n\npackage main\n\nimport "fmt"\n\n\nfunc answer() int {{\n    // Solve the problem here! Make sure to return the answer.\n    return 0\n}}\n\n\n// Below is OK to leave alone\nfunc main() {{\n    fmt.Println(answer())\n}}\n'
@@ -0,0 +1,102 @@
+""" Parsers for the Project Euler pages we read, working on the raw response bytes with lxml and compiled XPath.
+
+They give the same results the requests_html/pyquery element wrappers did, without building them.
+"""
+import re
+from typing import Dict, List, Tuple
+
+META_CHARSET = re.compile(rb'''<meta[^>]+charset=["']?([\w-]+)''', re.IGNORECASE)
+PAGE_HREF = re.compile(r'=([0-9]*)$')
+
+_xpaths = None
+
+
+def _compiled():
+    global _xpaths
+    if _xpaths is None:
+        from lxml import etree
+
+        def has_class(name):
+            return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+        _xpaths = {'tr': etree.XPath('//tr'),
+                   'has_id_column': etree.XPath(f'boolean(.//*[{has_class("id_column")}])'),
+                   'th': etree.XPath('.//th'),
+                   'td': etree.XPath('.//td'),
+                   'img_title': etree.XPath('(.//img)[1]/@title'),
+                   'href': etree.XPath('//a/@href'),
+                   'h2': etree.XPath('(//h2)[1]'),
+                   'problem_content': etree.XPath(f'(//*[{has_class("problem_content")}])[1]')}
+    return _xpaths
+
+
+def parse(content: bytes, encoding: str = None):
+    """ the lxml document of a page, decoded as its <meta charset> says (utf-8 if it doesn't) """
+    import lxml.html
+
+    if encoding is None:
+        charset = META_CHARSET.search(content[:2048])
+        encoding = charset.group(1).decode() if charset else 'utf-8'
+    return lxml.html.document_fromstring(content, parser=lxml.html.HTMLParser(encoding=encoding))
+
+
+def text(element) -> str:
+    """ an element's text with its whitespace squashed, like pyquery's text() """
+    return ' '.join(element.text_content().split())
+
+
+def html_text(html: str) -> str:
+    """ the text of an html fragment (eg a problem statement) with its whitespace squashed """
+    import lxml.html
+
+    if not html or not html.strip():
+        return ''
+    return text(lxml.html.fragment_fromstring(html, create_parent='div'))
+
+
+def parse_archive_page(content: bytes, url: str) -> List[Dict]:
+    """ the problem rows of an archives page """
+    xpaths = _compiled()
+    data = []
+    column_headers = []  # id, desc, solved_by, difficulty, solved
+    for i, tr in enumerate(xpaths['tr'](parse(content))):
+        if not xpaths['has_id_column'](tr):
+            continue
+
+        row = {_: None for _ in column_headers}
+        if i == 0:
+            column_headers.extend(_ for _ in map(text, xpaths['th'](tr)) if _)
+            continue
+
+        for j, td in enumerate(xpaths['td'](tr)):
+            if j < len(column_headers):
+                row[column_headers[j]] = text(td)
+            else:
+                row['Solved'] = xpaths['img_title'](td)[:1] == ['Solved']
+                break
+
+        row.update({'problem_url': f'https://projecteuler.net/problem={row["ID"]}'})
+        row.update({'page_url': url})
+        row.update({'ID': int(row['ID'])})
+        data.append(row)
+    return data
+
+
+def parse_page_qty(content: bytes, default: int = 15) -> int:
+    """ how many archive pages there are: the number the last numbered link on the page ends with """
+    for href in reversed(_compiled()['href'](parse(content))):
+        s = PAGE_HREF.search(href)
+        if s:
+            return int(s.group(1))
+    return default
+
+
+def parse_problem_page(content: bytes) -> Tuple[str, str]:
+    """ a problem's title and the html of its statement """
+    from lxml import etree
+
+    xpaths = _compiled()
+    document = parse(content)
+    title = xpaths['h2'](document)[0]
+    problem_content = xpaths['problem_content'](document)[0]
+    return text(title), etree.tostring(problem_content, encoding='unicode', with_tail=False).strip()
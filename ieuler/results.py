@@ -0,0 +1,39 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from ieuler.build import BuildError, toolchain_version
+from ieuler.cache import DiskCache
+from ieuler.language_templates import get_template
+from ieuler.runner import RunResult
+
+
+class ResultCache(object):
+    """ What unchanged solutions printed, keyed on their source, language and toolchain version.
+
+    Only runs that finished ok are kept; the least recently used are evicted once there are more than max_size bytes.
+    """
+
+    def __init__(self, dirname: str = None, max_size: int = 16 * 1024 * 1024):
+        self.cache = DiskCache(dirname or os.getenv('IEULER_RESULT_CACHE') or '.result-cache', max_size=max_size)
+
+    @staticmethod
+    def key(language: str, filename: str) -> Optional[str]:
+        try:
+            with open(filename, 'rb') as f:
+                source = f.read()
+            toolchain = toolchain_version(get_template(language))
+        except (FileNotFoundError, BuildError):
+            return None
+        return json.dumps([language, toolchain, hashlib.sha256(source).hexdigest()])
+
+    def get(self, key: str) -> Optional[RunResult]:
+        cached = self.cache.get(key)
+        if cached:
+            stdout, meta = cached
+            return RunResult(stdout=stdout, cached=True, **meta)
+
+    def set(self, key: str, result: RunResult):
+        if result.exit_reason == 'ok':
+            self.cache.set(key, result.stdout, result.as_dict())
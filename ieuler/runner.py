@@ -0,0 +1,198 @@
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, List
+
+# Project Euler's rule: every problem can be solved in under a minute
+ONE_MINUTE = 60
+
+
+class Limits(object):
+    """ Resource limits (rlimits) for a solution: memory in bytes, cpu in seconds, open_files a count. """
+
+    def __init__(self, memory: int = None, cpu: int = None, open_files: int = None):
+        self.memory = memory
+        self.cpu = cpu
+        self.open_files = open_files
+
+    @classmethod
+    def from_env(cls, memory_mb: int = None, cpu: int = None, open_files: int = None):
+        """ limits given here, or else from $IEULER_MEMORY_LIMIT (MB), $IEULER_CPU_LIMIT, $IEULER_OPEN_FILES_LIMIT """
+        memory_mb = memory_mb or int(os.getenv('IEULER_MEMORY_LIMIT') or 0)
+        return cls(memory=memory_mb * 2 ** 20 if memory_mb else None,
+                   cpu=cpu or int(os.getenv('IEULER_CPU_LIMIT') or 0) or None,
+                   open_files=open_files or int(os.getenv('IEULER_OPEN_FILES_LIMIT') or 0) or None)
+
+    def __bool__(self):
+        return any((self.memory, self.cpu, self.open_files))
+
+    def rlimits(self):
+        if self.memory:
+            yield resource.RLIMIT_AS, (self.memory, self.memory)
+        if self.cpu:
+            # the soft limit sends SIGXCPU, the hard one a second later SIGKILL
+            yield resource.RLIMIT_CPU, (self.cpu, self.cpu + 1)
+        if self.open_files:
+            yield resource.RLIMIT_NOFILE, (self.open_files, self.open_files)
+
+    def apply(self, pid: int = None):
+        """ set the limits on process pid, or on the current process (eg a forked child before it execs) """
+        for limit, values in self.rlimits():
+            if pid:
+                resource.prlimit(pid, limit, values)
+            else:
+                resource.setrlimit(limit, values)
+
+
+class RunResult(object):
+    """ What running a solution produced and what it cost. """
+
+    def __init__(self, command: List[str], returncode: int = None, stdout: bytes = b'', stderr: bytes = b'',
+                 wall_time: float = None, cpu_time: float = None, max_rss: int = None, exit_reason: str = None,
+                 cached: bool = False):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss  # bytes
+        self.exit_reason = exit_reason  # ok, error, signal, timeout, cpu-limit, memory-limit, build-error or cancelled
+        self.cached = cached  # an earlier run of the same source, not a new one
+
+    @property
+    def answer(self) -> str:
+        return self.stdout.decode(errors='replace').strip('\n')
+
+    @property
+    def over_one_minute(self) -> bool:
+        return self.wall_time is not None and self.wall_time > ONE_MINUTE
+
+    def summary(self) -> str:
+        cost = [f'{self.wall_time:.3f} s wall' if self.wall_time is not None else None,
+                f'{self.cpu_time:.3f} s cpu' if self.cpu_time is not None else None,
+                f'{self.max_rss / 2 ** 20:.1f} MB peak memory' if self.max_rss is not None else None]
+        cost = [_ for _ in cost if _] + (['cached'] if self.cached else [])
+        return f'{self.exit_reason} ({", ".join(cost)})' if cost else f'{self.exit_reason}'
+
+    def as_dict(self) -> Dict:
+        return {'command': self.command,
+                'returncode': self.returncode,
+                'exit_reason': self.exit_reason,
+                'wall_time': self.wall_time,
+                'cpu_time': self.cpu_time,
+                'max_rss': self.max_rss}
+
+
+def _max_rss_bytes(ru_maxrss: int) -> int:
+    # linux reports kilobytes, macOS bytes
+    return ru_maxrss if sys.platform == 'darwin' else ru_maxrss * 1024
+
+
+def run(command: List[str], timeout: float = ONE_MINUTE, cwd: str = None, limits: Limits = None,
+        on_stdout: Callable[[bytes], None] = None, on_stderr: Callable[[bytes], None] = None,
+        cancel: threading.Event = None) -> RunResult:
+    """ run command within limits, measuring its own wall time, cpu time and peak memory (not just ours)
+
+    on_stdout and on_stderr are called with each line as it is written, so output can be shown live.
+    Setting cancel kills the run early.
+    """
+    # a preexec_fn isn't safe while other threads run (bench runs solutions from a pool), so the limits are put on
+    # the child once it has started; only where there is no prlimit (macOS) does the child set them itself
+    prlimit = bool(limits) and hasattr(resource, 'prlimit')
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+                               preexec_fn=limits.apply if limits and not prlimit else None)
+    if prlimit:
+        try:
+            limits.apply(process.pid)
+        except ProcessLookupError:
+            pass  # it has already exited
+    result = watch(command, process.pid, process.stdout, process.stderr, timeout=timeout, limits=limits,
+                   on_stdout=on_stdout, on_stderr=on_stderr, cancel=cancel, start=start)
+    process.returncode = result.returncode  # already reaped
+    return result
+
+
+def watch(command: List[str], pid: int, stdout: BinaryIO, stderr: BinaryIO, timeout: float = ONE_MINUTE,
+          limits: Limits = None, on_stdout: Callable[[bytes], None] = None, on_stderr: Callable[[bytes], None] = None,
+          cancel: threading.Event = None, start: float = None) -> RunResult:
+    """ read a started child's output pipes and reap it, killing it once it runs past timeout or is cancelled """
+    start = time.perf_counter() if start is None else start
+    output = {}
+    callbacks = {'stdout': on_stdout, 'stderr': on_stderr}
+
+    def read(name, stream):
+        lines = []
+        for line in iter(stream.readline, b''):
+            lines.append(line)
+            if callbacks[name]:
+                callbacks[name](line)
+        output[name] = b''.join(lines)
+
+    readers = [threading.Thread(target=read, args=_) for _ in (('stdout', stdout), ('stderr', stderr))]
+    for _ in readers:
+        _.start()
+
+    timed_out = threading.Event()
+    cancelled = threading.Event()
+    finished = threading.Event()
+
+    def kill(reason):
+        reason.set()
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def watch_cancel():
+        while not finished.wait(0.05):
+            if cancel.is_set():
+                kill(cancelled)
+                return
+
+    timer = threading.Timer(timeout, kill, args=(timed_out,))
+    timer.start()
+    if cancel is not None:
+        threading.Thread(target=watch_cancel, daemon=True).start()
+    try:
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(pid, 0)
+            cpu_time = rusage.ru_utime + rusage.ru_stime
+            max_rss = _max_rss_bytes(rusage.ru_maxrss)
+        else:
+            _, status = os.waitpid(pid, 0)
+            cpu_time = max_rss = None
+    finally:
+        timer.cancel()
+        finished.set()
+    returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    wall_time = time.perf_counter() - start
+    for _ in readers:
+        _.join()
+    stdout.close()
+    stderr.close()
+
+    stderr = output.get('stderr', b'')
+    if cancelled.is_set():
+        exit_reason = 'cancelled'
+    elif timed_out.is_set():
+        exit_reason = 'timeout'
+    elif limits and limits.cpu and returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        exit_reason = 'cpu-limit'
+    elif limits and limits.memory and (b'MemoryError' in stderr or b'bad_alloc' in stderr
+                                       or returncode in (-signal.SIGSEGV, -signal.SIGABRT)):
+        exit_reason = 'memory-limit'
+    elif returncode == 0:
+        exit_reason = 'ok'
+    elif returncode < 0:
+        exit_reason = 'signal'
+    else:
+        exit_reason = 'error'
+
+    return RunResult(command, returncode=returncode, stdout=output.get('stdout', b''), stderr=stderr,
+                     wall_time=wall_time, cpu_time=cpu_time, max_rss=max_rss, exit_reason=exit_reason)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, List
+
+from ieuler.parsing import html_text
+
+# the problem fields that are searched
+SEARCH_FIELDS = ('Description / Title', 'Problem',)
+WORD = re.compile(r'\w+')
+
+
+def search_hash(problem: Dict) -> str:
+    return hashlib.sha256(json.dumps([problem.get(_) for _ in SEARCH_FIELDS]).encode()).hexdigest()
+
+
+def match_expression(query: str) -> str:
+    """ an FTS5 query matching problems with every word of query (as a prefix), so punctuation can't break it """
+    return ' '.join(f'"{_}"*' for _ in WORD.findall(query))
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+class SearchIndex(object):
+    """ An on-disk inverted index of problem titles and statements (SQLite FTS5, porter stemmed).
+
+    update() only re-indexes the problems whose title or statement changed since they were last indexed, so it can
+    be handed every problem of a fetch.  Titles and statements are indexed apart, so each is scored by BM25 against
+    its own lengths (most statements aren't fetched, and a long one shouldn't sink its title's match), and a problem
+    matches when its title or its statement has every word.  Title scores are weighted over statement ones.
+    """
+    SCHEMA_VERSION = 1
+    TITLE_WEIGHT = 10.0
+    TOKENIZE = 'porter unicode61 remove_diacritics 2'
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._connection = None
+        self._unavailable = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self._unavailable:
+                raise SearchUnavailable(self._unavailable)
+            connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None, check_same_thread=False)
+            try:
+                self._migrate(connection)
+            except sqlite3.OperationalError as e:
+                connection.close()
+                self._unavailable = f'Search needs SQLite built with FTS5 (this is {sqlite3.sqlite_version}): {e}'
+                raise SearchUnavailable(self._unavailable)
+            self._connection = connection
+        return self._connection
+
+    def _migrate(self, connection: sqlite3.Connection):
+        if connection.execute('PRAGMA user_version').fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        # like the problem store: take the write lock, then see what another process left to do
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if connection.execute('PRAGMA user_version').fetchone()[0] < 1:
+                connection.execute('CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, hash TEXT NOT NULL)')
+                connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(title, tokenize = "
+                                   f"'{self.TOKENIZE}')")
+                connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS statements USING fts5(text, tokenize = "
+                                   f"'{self.TOKENIZE}')")
+                connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT count(*) FROM documents').fetchone()[0]
+
+    def update(self, problems: List[Dict]) -> int:
+        """ index the problems whose title or statement changed, returns how many were (re-)indexed """
+        hashes = {int(_['ID']): search_hash(_) for _ in problems if any(_.get(k) for k in SEARCH_FIELDS)}
+        if not hashes:
+            return 0
+        with self._lock:
+            connection = self.connection
+            # most updates change no title or statement, so look before taking the write lock
+            if not self._changed(problems, hashes):
+                return 0
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                changed = self._changed(problems, hashes)
+                for _ in changed:
+                    number = int(_['ID'])
+                    connection.execute('DELETE FROM titles WHERE rowid = ?', (number,))
+                    connection.execute('DELETE FROM statements WHERE rowid = ?', (number,))
+                    connection.execute('INSERT INTO titles (rowid, title) VALUES (?, ?)',
+                                       (number, _.get('Description / Title') or ''))
+                    connection.execute('INSERT INTO statements (rowid, text) VALUES (?, ?)',
+                                       (number, html_text(_.get('Problem'))))
+                    connection.execute('INSERT OR REPLACE INTO documents (id, hash) VALUES (?, ?)',
+                                       (number, hashes[number]))
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        return len(changed)
+
+    def _changed(self, problems: List[Dict], hashes: Dict[int, str]) -> List[Dict]:
+        indexed = dict(self.connection.execute('SELECT id, hash FROM documents WHERE id IN '
+                                               '(SELECT value FROM json_each(?))', (json.dumps(list(hashes)),)))
+        return [_ for _ in problems if int(_['ID']) in hashes and indexed.get(int(_['ID'])) != hashes[int(_['ID'])]]
+
+    def clear(self):
+        with self._lock:
+            self.connection.executescript('BEGIN IMMEDIATE; DELETE FROM titles; DELETE FROM statements; '
+                                          'DELETE FROM documents; COMMIT;')
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """ the problems matching every word of query, best first: {'ID', 'Description / Title', 'snippet', 'score'} """
+        match = match_expression(query)
+        if not match:
+            return []
+        with self._lock:
+            # bm25() is negative, lower is better; snippets are only made for the problems shown
+            rows = self.connection.execute(
+                'SELECT id, (SELECT title FROM titles WHERE rowid = id), '
+                "(SELECT snippet(statements, 0, '[', ']', '...', 12) FROM statements "
+                ' WHERE statements MATCH ? AND rowid = id), score FROM ('
+                '    SELECT id, sum(score) AS score FROM ('
+                '        SELECT rowid AS id, ? * bm25(titles) AS score FROM titles WHERE titles MATCH ?'
+                '        UNION ALL'
+                '        SELECT rowid, bm25(statements) FROM statements WHERE statements MATCH ?'
+                '    ) GROUP BY id ORDER BY score, id LIMIT ?'
+                ') ORDER BY score, id', (match, self.TITLE_WEIGHT, match, match, limit)).fetchall()
+        return [{'ID': _[0], 'Description / Title': _[1], 'snippet': _[2], 'score': -_[3]} for _ in rows]
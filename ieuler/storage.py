@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional
+
+# ls -sort keys and the indexed column each sorts by
+SORTS = {'id': 'id', 'solved-by': 'solved_by', 'title': 'title'}
+
+
+def get_store(kind, filename):
+    for _ in ProblemStore.__subclasses__():
+        if _.kind == kind:
+            return _(filename)
+
+
+def supported_stores():
+    return [_.kind for _ in ProblemStore.__subclasses__()]
+
+
+def solved_by(problem: Dict) -> Optional[int]:
+    """ the Solved By count as a number ('1,234' -> 1234) """
+    try:
+        return int(str(problem.get('Solved By')).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def languages(problem: Dict) -> List[str]:
+    """ the languages there is code for """
+    return sorted(problem.get('code') or {})
+
+
+def summary(problem: Dict) -> Dict:
+    """ the fields ls -table shows """
+    return {'ID': int(problem['ID']), 'Description / Title': problem.get('Description / Title'),
+            'Solved By': solved_by(problem), 'Solved': bool(problem.get('Solved')), 'languages': languages(problem)}
+
+
+class ProblemStore(object):
+    """ Where the problems are kept between runs.
+
+    upsert takes partial problems (at least an ID) and merges them into what is stored, like dict.update.
+    """
+    kind = None
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self) -> List[Dict]:
+        pass
+
+    def get(self, number: int) -> Optional[Dict]:
+        pass
+
+    def upsert(self, problems: List[Dict]) -> None:
+        pass
+
+    def count(self) -> int:
+        return len(self.load())
+
+    def query(self, solved: bool = None, ids: List[int] = None, min_solved_by: int = None,
+              max_solved_by: int = None, language: str = None, sort: str = 'id', reverse: bool = False,
+              full: bool = True) -> Iterator[Dict]:
+        """ the problems matching every filter given, sorted by one of SORTS (then ID)
+
+        full gives the whole stored problems, otherwise just their summary().
+        """
+        ids = set(ids) if ids is not None else None
+        matches = []
+        for _ in self.load():
+            row = summary(_)
+            if (solved is None or row['Solved'] == solved) and (ids is None or row['ID'] in ids) \
+                    and (min_solved_by is None or (row['Solved By'] or 0) >= min_solved_by) \
+                    and (max_solved_by is None or (row['Solved By'] or 0) <= max_solved_by) \
+                    and (language is None or language in row['languages']):
+                matches.append((_, row))
+        key = {'id': 'ID', 'solved-by': 'Solved By', 'title': 'Description / Title'}[sort]
+        matches.sort(key=lambda _: _[1]['ID'])
+        matches.sort(key=lambda _: (_[1][key] is not None, _[1][key] or 0), reverse=reverse)
+        return (_[0] if full else _[1] for _ in matches)
+
+
+class JSONProblemStore(ProblemStore):
+    """ The whole list of problems in one JSON file, rewritten on every update. """
+    kind = 'json'
+
+    def load(self) -> List[Dict]:
+        try:
+            with open(self.filename, 'rt') as f:
+                return json.load(f)
+        except (json.decoder.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def get(self, number: int) -> Optional[Dict]:
+        for _ in self.load():
+            if int(_['ID']) == int(number):
+                return _
+
+    def upsert(self, problems: List[Dict]) -> None:
+        stored = {int(_['ID']): _ for _ in self.load()}
+        for _ in problems:
+            stored.setdefault(int(_['ID']), {}).update(_)
+        data = json.dumps([stored[_] for _ in sorted(stored)])
+        with open(self.filename, 'wt') as f:
+            f.write(data)
+
+
+class SQLiteProblemStore(ProblemStore):
+    """ One row per problem in SQLite, so an update only writes the problems that changed.
+
+    A legacy JSON problems file found at filename is migrated into the database the first time it is opened,
+    and kept next to it as filename.json.bak.  The fields ls filters and sorts on are kept in indexed columns (and
+    the languages with code in their own table) as problems are upserted, so a query only reads the rows it returns.
+    """
+    kind = 'sqlite'
+    SCHEMA_VERSION = 2
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            legacy_problems = self._take_legacy_json()
+            self._connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None,
+                                               check_same_thread=False)
+            self._migrate()
+            if legacy_problems:
+                self.upsert(legacy_problems)
+        return self._connection
+
+    def _take_legacy_json(self) -> List[Dict]:
+        try:
+            with open(self.filename, 'rb') as f:
+                header = f.read(16)
+        except FileNotFoundError:
+            return []
+        if not header or header == b'SQLite format 3\x00':
+            return []
+
+        problems = JSONProblemStore(self.filename).load()
+        os.replace(self.filename, f'{self.filename}.json.bak')
+        return problems
+
+    def _migrate(self):
+        connection = self._connection
+        if connection.execute('PRAGMA user_version').fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        # another ilr process may be upgrading too: take the write lock, then see what is still left to do
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version < 1:
+                connection.execute('CREATE TABLE IF NOT EXISTS problems '
+                                   '(id INTEGER PRIMARY KEY, solved INTEGER, data TEXT NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS problems_solved ON problems (solved)')
+            if version < 2:
+                connection.execute('ALTER TABLE problems ADD COLUMN title TEXT')
+                connection.execute('ALTER TABLE problems ADD COLUMN solved_by INTEGER')
+                connection.execute('CREATE TABLE IF NOT EXISTS problem_languages (language TEXT NOT NULL, '
+                                   'id INTEGER NOT NULL, PRIMARY KEY (language, id)) WITHOUT ROWID')
+                connection.execute('CREATE INDEX IF NOT EXISTS problems_solved_by ON problems (solved_by)')
+                connection.execute('CREATE INDEX IF NOT EXISTS problems_title ON problems (title)')
+                for number, data in connection.execute('SELECT id, data FROM problems').fetchall():
+                    self._index(number, json.loads(data))
+            if version < self.SCHEMA_VERSION:
+                connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _index(self, number: int, problem: Dict):
+        self._connection.execute('UPDATE problems SET title = ?, solved_by = ? WHERE id = ?',
+                                 (problem.get('Description / Title'), solved_by(problem), number))
+        self._connection.execute('DELETE FROM problem_languages WHERE id = ?', (number,))
+        self._connection.executemany('INSERT INTO problem_languages (language, id) VALUES (?, ?)',
+                                     [(_, number) for _ in languages(problem)])
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            rows = self.connection.execute('SELECT data FROM problems ORDER BY id').fetchall()
+        return [json.loads(_[0]) for _ in rows]
+
+    def get(self, number: int) -> Optional[Dict]:
+        with self._lock:
+            row = self.connection.execute('SELECT data FROM problems WHERE id = ?', (int(number),)).fetchone()
+        if row:
+            return json.loads(row[0])
+
+    def upsert(self, problems: List[Dict]) -> None:
+        if not problems:
+            return
+        with self._lock:
+            connection = self.connection
+            # merge with what is stored now (not what we loaded) so concurrent ilr processes don't clobber each other
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                for _ in problems:
+                    number = int(_['ID'])
+                    row = connection.execute('SELECT data FROM problems WHERE id = ?', (number,)).fetchone()
+                    problem = json.loads(row[0]) if row else {}
+                    problem.update(_)
+                    connection.execute('INSERT OR REPLACE INTO problems (id, solved, data) VALUES (?, ?, ?)',
+                                       (number, bool(problem.get('Solved')), json.dumps(problem)))
+                    self._index(number, problem)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def count(self) -> int:
+        with self._lock:
+            return self.connection.execute('SELECT count(*) FROM problems').fetchone()[0]
+
+    def query(self, solved: bool = None, ids: List[int] = None, min_solved_by: int = None,
+              max_solved_by: int = None, language: str = None, sort: str = 'id', reverse: bool = False,
+              full: bool = True) -> Iterator[Dict]:
+        where, params = [], []
+        if solved is not None:
+            where.append('solved = ?')
+            params.append(bool(solved))
+        if ids is not None:
+            ids = sorted(set(ids))
+            if ids and ids[-1] - ids[0] + 1 == len(ids):
+                where.append('id BETWEEN ? AND ?')
+                params.extend((ids[0], ids[-1]))
+            else:
+                where.append('id IN (SELECT value FROM json_each(?))')
+                params.append(json.dumps(ids))
+        if min_solved_by is not None:
+            where.append('solved_by >= ?')
+            params.append(min_solved_by)
+        if max_solved_by is not None:
+            where.append('solved_by <= ?')
+            params.append(max_solved_by)
+        if language is not None:
+            where.append('id IN (SELECT id FROM problem_languages WHERE language = ?)')
+            params.append(language)
+        order = ' DESC' if reverse else ''
+        columns = 'data' if full else \
+            "id, title, solved_by, solved, (SELECT group_concat(language, ',') FROM problem_languages l " \
+            "WHERE l.id = problems.id)"
+        sql = f'SELECT {columns} FROM problems {"WHERE " + " AND ".join(where) if where else ""} ' \
+              f'ORDER BY {SORTS[sort]}{order}, id'
+        with self._lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        if full:
+            return (json.loads(_[0]) for _ in rows)
+        return ({'ID': _[0], 'Description / Title': _[1], 'Solved By': _[2], 'Solved': bool(_[3]),
+                 'languages': sorted(_[4].split(',')) if _[4] else []} for _ in rows)
@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+from typing import Dict, List
+
+
+class SubmissionQueue(object):
+    """ Answers waiting to be submitted to Project Euler, kept on disk so an interrupted drain picks up where it was.
+
+    The queue is a JSON list of {'ID', 'language', 'answer'}, one entry per problem, in the order they were queued.
+    An entry is removed once Project Euler has answered it.
+    """
+
+    def __init__(self, filename: str = None):
+        self.filename = filename or os.getenv('IEULER_SUBMIT_QUEUE') or '.submit-queue'
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict]:
+        try:
+            with open(self.filename, 'rt') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return []
+
+    def dump(self, entries: List[Dict]):
+        tmp = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wt') as f:
+            json.dump(entries, f, sort_keys=True, indent=4)
+        os.replace(tmp, self.filename)  # a ctrl-c never leaves half a queue behind
+
+    def put(self, entries: List[Dict]):
+        """ queue answers, replacing any still queued for the same problem """
+        with self._lock:
+            numbers = {int(_['ID']) for _ in entries}
+            self.dump([_ for _ in self.load() if int(_['ID']) not in numbers] + list(entries))
+
+    def remove(self, number: int):
+        with self._lock:
+            self.dump([_ for _ in self.load() if int(_['ID']) != int(number)])
+
+    def __len__(self):
+        return len(self.load())
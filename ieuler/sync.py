@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+# bump when the wire format changes, the server echoes the version it speaks in X-Ieuler-Sync
+SYNC_VERSION = 1
+# what the ieuler-server keeps of a problem
+SYNC_FIELDS = ('code', 'Solved', 'completed_on', 'correct_answer',)
+
+
+def sync_payload(problem: Dict) -> Optional[Dict]:
+    """ the part of a problem the server keeps, or None if there is nothing worth keeping (no code) """
+    if 'code' not in problem:
+        return None
+    payload = {_: problem.get(_) for _ in SYNC_FIELDS}
+    payload['ID'] = problem['ID']
+    return payload
+
+
+def sync_hash(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class SyncState(object):
+    """ What the ieuler-server has acknowledged, so a sync only sends (and pulls) what changed since.
+
+    The state is kept per server and user: {'server', 'username', 'acked': {ID: hash}, 'cursor', 'version'}.
+    cursor is the server's opaque position in its change log, version the sync version it last echoed (or None).
+    """
+
+    def __init__(self, filename: str, server: str, username: str):
+        self.filename = filename
+        self.server = server
+        self.username = username
+        self.state = self.load()
+
+    def load(self) -> Dict:
+        try:
+            with open(self.filename, 'rt') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            state = {}
+        if state.get('server') != self.server or state.get('username') != self.username:
+            state = {'server': self.server, 'username': self.username}
+        state.setdefault('acked', {})
+        state.setdefault('cursor', None)
+        state.setdefault('version', None)
+        return state
+
+    def dump(self):
+        tmp = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wt') as f:
+            json.dump(self.state, f, sort_keys=True)
+        os.replace(tmp, self.filename)
+
+    @property
+    def cursor(self) -> Optional[str]:
+        return self.state['cursor']
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.state['version']
+
+    def changed(self, payloads: List[Dict]) -> List[Dict]:
+        """ the payloads the server hasn't acknowledged in exactly this state """
+        acked = self.state['acked']
+        return [_ for _ in payloads if acked.get(str(_['ID'])) != sync_hash(_)]
+
+    def ack(self, payloads: List[Dict], cursor: str = None, version: int = None):
+        for _ in payloads:
+            self.state['acked'][str(_['ID'])] = sync_hash(_)
+        if cursor is not None:
+            self.state['cursor'] = cursor
+        if version is not None:
+            self.state['version'] = version
+        self.dump()
+
+    def reset(self):
+        self.state = {'server': self.server, 'username': self.username, 'acked': {}, 'cursor': None, 'version': None}
+        self.dump()
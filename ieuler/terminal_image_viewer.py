@@ -1,8 +1,13 @@
 # https://github.com/nikhilkumarsingh/terminal-image-viewer
 
+import shutil
+import sys
+
 import numpy as np
 from PIL import Image
 
+UPPER_HALF_BLOCK = '▀'
+
 
 def get_ansi_color_code(r, g, b):
     if r == g and g == b:
@@ -14,17 +19,48 @@ def get_ansi_color_code(r, g, b):
     return 16 + (36 * round(r / 255 * 5)) + (6 * round(g / 255 * 5)) + round(b / 255 * 5)
 
 
+def get_ansi_color_codes(img_arr: np.ndarray) -> np.ndarray:
+    """ get_ansi_color_code for every pixel of an (h, w, 3) array at once """
+    rgb = img_arr[..., :3].astype(np.float64)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    color = 16 + 36 * np.round(r / 255 * 5) + 6 * np.round(g / 255 * 5) + np.round(b / 255 * 5)
+    gray = np.where(r < 8, 16, np.where(r > 248, 231, np.round((r - 8) / 247 * 24) + 232))
+    return np.where((r == g) & (g == b), gray, color).astype(np.int16)
+
+
 def get_color(r, g, b):
     return "\x1b[48;5;{}m \x1b[0m".format(int(get_ansi_color_code(r, g, b)))
 
 
-def show_image(img: Image):
-    img_arr = np.asarray(img)
-    h, w, c = img_arr.shape
+def render(img: Image, width: int = None) -> str:
+    """ the image as text, two pixel rows per line (the top pixel is the foreground of ▀, the bottom its background)
+
+    The image is shrunk to fit width columns, and neighbouring cells of the same colours share one escape sequence.
+    """
+    img = img.convert('RGB')
+    if width and img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))))
+    codes = get_ansi_color_codes(np.asarray(img))
+    if codes.shape[0] % 2:
+        codes = np.vstack([codes, np.full((1, codes.shape[1]), -1, dtype=codes.dtype)])  # -1: no pixel
+    top, bottom = codes[0::2], codes[1::2]
+    cells = top.astype(np.int32) * 512 + (bottom + 1)
+
+    lines = []
+    for row_top, row_bottom, row in zip(top, bottom, cells):
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(row)) + 1))
+        ends = np.append(starts[1:], len(row))
+        line = []
+        for start, end in zip(starts, ends):
+            background = f'48;5;{row_bottom[start]}' if row_bottom[start] >= 0 else '49'
+            line.append(f'\x1b[38;5;{row_top[start]};{background}m{UPPER_HALF_BLOCK * (end - start)}')
+        lines.append(''.join(line) + '\x1b[0m\n')
+    return ''.join(lines)
 
-    for x in range(h):
-        for y in range(w):
-            pix = img_arr[x][y]
-            print(get_color(pix[0], pix[1], pix[2]), sep='', end='')
-        print()
 
+def show_image(img: Image, width: int = None, file=None):
+    """ draw the image in the terminal in one write, no wider than width (default: the terminal's width) """
+    file = file or sys.stdout
+    width = width or shutil.get_terminal_size().columns
+    file.write(render(img, width))
+    file.flush()
@@ -0,0 +1,26 @@
+""" Wall-clock cost of the startup phases, reported by ilr --timings. """
+import contextlib
+import time
+
+started = time.perf_counter()
+phases = []
+
+
+def record(phase: str, seconds: float = None):
+    """ record a phase, by default as the time since the ieuler package started importing """
+    phases.append((phase, time.perf_counter() - started if seconds is None else seconds))
+
+
+@contextlib.contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def report() -> str:
+    lines = [f'{phase:<32}{seconds * 1000:9.1f} ms' for phase, seconds in phases]
+    lines.append(f'{"total (since import)":<32}{(time.perf_counter() - started) * 1000:9.1f} ms')
+    return '\n'.join(lines)
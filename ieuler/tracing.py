@@ -0,0 +1,157 @@
+""" Spans of where an ilr command's time went, written as a Chrome trace (or JSON lines) by ilr --trace FILE.
+
+Open chrome://tracing or https://ui.perfetto.dev and load the file.  Every span counts the HTTP requests made (and
+bytes sent and received) while it was open.  Until start() is called span() hands back a shared do-nothing span,
+so instrumented code costs one global lookup and a call when tracing is off.
+"""
+import functools
+import json
+import os
+import threading
+import time
+
+_tracer = None
+
+
+class Tracer(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.totals = {'requests': 0, 'bytes_sent': 0, 'bytes_received': 0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def now(self) -> float:
+        """ microseconds since the trace started """
+        return (time.perf_counter() - self.started) * 1e6
+
+    @property
+    def stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def add(self, event):
+        event.update({'pid': self.pid, 'tid': threading.get_ident()})
+        with self._lock:
+            self.events.append(event)
+
+    def count_request(self, bytes_sent: int, bytes_received: int):
+        counts = {'requests': 1, 'bytes_sent': bytes_sent, 'bytes_received': bytes_received}
+        with self._lock:
+            for k, v in counts.items():
+                self.totals[k] += v
+        for span in self.stack:
+            for k, v in counts.items():
+                span.args[k] = span.args.get(k, 0) + v
+
+    def dump(self, filename: str):
+        with self._lock:
+            events = sorted(self.events, key=lambda _: _['ts'])
+        with open(filename, 'wt') as f:
+            if filename.endswith('.jsonl'):
+                for _ in events:
+                    f.write(json.dumps(_, sort_keys=True) + '\n')
+            else:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.totals}, f)
+
+
+class Span(object):
+    def __init__(self, tracer: Tracer, name: str, category: str, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        """ add details to the span, eg what it found out """
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = self.tracer.now()
+        self.tracer.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = self.tracer.now()
+        stack = self.tracer.stack
+        if self in stack:
+            stack.remove(self)
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.add({'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': self.start, 'dur': end - self.start,
+                         'args': self.args})
+
+
+class NoSpan(object):
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def start() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop(filename: str = None):
+    """ stop tracing, writing what was traced to filename """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and filename:
+        tracer.dump(filename)
+    return tracer
+
+
+def span(name: str, category: str = 'ilr', **args):
+    if _tracer is None:
+        return NO_SPAN
+    return Span(_tracer, name, category, args)
+
+
+def traced(name: str, category: str = 'ilr'):
+    """ decorate a function so each call is a span """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with Span(_tracer, name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def on_response(r, *args, **kwargs):
+    """ a requests response hook: an http span for the request, counted against every span open around it """
+    tracer = _tracer
+    if tracer is None:
+        return
+    sent = len(r.request.body or b'') if r.request is not None else 0
+    received = len(r.content or b'')
+    end = tracer.now()
+    duration = r.elapsed.total_seconds() * 1e6
+    tracer.add({'name': f'{r.request.method} {r.url}', 'cat': 'http', 'ph': 'X', 'ts': end - duration,
+                'dur': duration, 'args': {'status': r.status_code, 'bytes_sent': sent, 'bytes_received': received}})
+    tracer.count_request(sent, received)
+
+
+def instrument(session):
+    """ trace the requests a requests.Session makes (if tracing is on) """
+    if _tracer is not None and on_response not in session.hooks['response']:
+        session.hooks['response'].append(on_response)
+    return session
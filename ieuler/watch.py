@@ -0,0 +1,90 @@
+""" Call back when a file is saved, using inotify where there is one and polling its stat where there isn't. """
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+_EVENT = struct.Struct('iIII')
+
+
+def _inotify(dirname: str):
+    """ an inotify fd watching dirname for writes and renames, or None where inotify is not available """
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # editors often save by writing a new file and renaming it over the old one, so watch the directory
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(dirname), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _names(buffer: bytes):
+    offset = 0
+    while offset + _EVENT.size <= len(buffer):
+        _, _, _, length = _EVENT.unpack_from(buffer, offset)
+        offset += _EVENT.size
+        yield os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+        offset += length
+
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def watch_file(path: str, on_change: Callable[[], None], debounce: float = 0.2, poll_interval: float = 0.5,
+               stop: threading.Event = None, use_inotify: bool = True):
+    """ call on_change once a burst of saves to path has been quiet for debounce seconds, until stop is set """
+    stop = stop or threading.Event()
+    path = os.path.abspath(path)
+    dirname, basename = os.path.split(path)
+    fd = _inotify(dirname) if use_inotify else None
+    last = _stat(path)
+    pending = None  # when the latest unhandled save happened
+    try:
+        while not stop.is_set():
+            timeout = poll_interval if pending is None else max(0.0, pending + debounce - time.monotonic())
+            changed = False
+            if fd is not None:
+                ready, _, _ = select.select([fd], [], [], timeout)
+                if ready:
+                    try:
+                        changed = basename in _names(os.read(fd, 64 * 1024))
+                    except BlockingIOError:
+                        pass
+            else:
+                stop.wait(min(timeout, poll_interval))
+                current = _stat(path)
+                changed, last = current != last, current
+
+            if changed:
+                pending = time.monotonic()
+            elif pending is not None and time.monotonic() - pending >= debounce:
+                pending = None
+                if os.path.exists(path):
+                    on_change()
+    finally:
+        if fd is not None:
+            os.close(fd)
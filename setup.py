@@ -8,6 +8,7 @@ install_requires = [
     'click',
     'Pillow',
     'numpy',
+    'lxml',
     'requests-html',
     'rever'
 ]
@@ -31,11 +31,14 @@ def solved_problem_4():
 
 @pytest.fixture
 def default_client(problems, solved_problem_4):
-    d = [tempfile.mkstemp() for _ in range(0, 4)]  # make 4 temp files
+    d = [tempfile.mkstemp() for _ in range(0, 7)]  # make 7 temp files
     client = Client(cookies_filename=d[0][1],
                     credentials_filename=d[1][1],
                     problems_filename=d[2][1],
-                    default_language_filename=d[3][1])
+                    default_language_filename=d[3][1],
+                    login_state_filename=d[4][1],
+                    sync_state_filename=d[5][1],
+                    search_index_filename=d[6][1])
     ping_ipe = client.ping_ipe
     get_all_problems = client.get_all_problems
     get_from_ipe = client.get_from_ipe
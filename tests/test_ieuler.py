@@ -1,8 +1,27 @@
 import json
 import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
 
-from ieuler.cli import ilr, fetch
+import click
+import pytest
+import requests
+
+from ieuler import forkserver, tracing
+from ieuler.assets import AssetMirror, find_asset_urls, open_asset
+from ieuler.cache import DiskCache, HTTPCache
+from ieuler.cli import ilr, fetch, parse_range, run_solution
+from ieuler.client import Client, NotLoggedIn, LoginUnsuccessful, require_login
 from ieuler.language_templates import get_template
+from ieuler.runner import Limits, run
+from ieuler.storage import JSONProblemStore, SQLiteProblemStore
+from ieuler.submissions import SubmissionQueue
+from ieuler.watch import watch_file
 
 
 def test_default_client(default_client, problems):
@@ -67,3 +86,871 @@ def test_fetch(runner, default_session):
 
     # assert number 4 has code (see conftest)
     assert 'code' in default_session.client.problems[3]
+
+
+def test_get_all_problems_concurrently(default_client, problems):
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def get_problem_list_on_page(page):
+        with lock:
+            running.append(page)
+            max_running.append(len(running))
+        time.sleep(random.random() / 50)
+        with lock:
+            running.remove(page)
+        return problems[(page - 1) * 10:page * 10]
+
+    default_client.get_page_qty = MagicMock(return_value=8)
+    default_client.get_problem_list_on_page = MagicMock(side_effect=get_problem_list_on_page)
+
+    all_problems = Client.get_all_problems(default_client, concurrency=3)
+    assert [_['ID'] for _ in all_problems] == [_['ID'] for _ in problems[:80]]
+    assert max(max_running) <= 3
+
+
+def _response(url, status_code=200, content=b'<html></html>', headers=None):
+    r = requests.Response()
+    r.url = url
+    r.status_code = status_code
+    r._content = content
+    r.encoding = 'utf-8'
+    r.headers.update(headers or {})
+    return r
+
+
+def test_http_cache(tmp_path):
+    http_cache = HTTPCache(DiskCache(str(tmp_path)), {'problem': None, 'archives': 0})
+    session = MagicMock()
+
+    url = 'https://projecteuler.net/problem=1'
+    session.get = MagicMock(return_value=_response(url, content=b'<h2>Multiples of 3 and 5</h2>'))
+    assert http_cache.get(session, url, 'problem').content == b'<h2>Multiples of 3 and 5</h2>'
+    r = http_cache.get(session, url, 'problem')
+    assert r.content == b'<h2>Multiples of 3 and 5</h2>'
+    assert r.html.find('h2', first=True).text == 'Multiples of 3 and 5'
+    assert session.get.call_count == 1
+
+    url = 'https://projecteuler.net/archives'
+    session.get = MagicMock(return_value=_response(url, headers={'ETag': '"abc"'}))
+    http_cache.get(session, url, 'archives', vary='me')
+    session.get = MagicMock(return_value=_response(url, status_code=304, content=b''))
+    assert http_cache.get(session, url, 'archives', vary='me').content == b'<html></html>'
+    session.get.assert_called_once_with(url, headers={'If-None-Match': '"abc"'})
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=3000)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, b'x' * 900)
+        time.sleep(0.01)
+    cache.get('a')  # a is now more recent than b
+    cache.set('d', b'x' * 900)
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c') and cache.get('d')
+
+
+def test_require_login_trusts_verified_session(default_client):
+    default_client.dump_credentials({'username': 'euler', 'password': 'secret'})
+    default_client.dump_cookies({'PHPSESSID': 'abc'})
+
+    @require_login
+    def whoami(client):
+        return 'euler'
+
+    assert whoami(default_client) == 'euler'
+    assert whoami(default_client) == 'euler'
+    assert default_client.logged_in.call_count == 1
+
+    default_client.dump_cookies({'PHPSESSID': 'xyz'})  # a different cookie jar has to be verified again
+    whoami(default_client)
+    assert default_client.logged_in.call_count == 2
+
+
+def test_require_login_retries_once_when_unauthenticated(default_client):
+    default_client.dump_credentials({'username': 'euler', 'password': 'secret'})
+    default_client.dump_cookies({'PHPSESSID': 'abc'})
+    calls = []
+
+    @require_login
+    def stale_once(client):
+        calls.append(1)
+        if len(calls) == 1:
+            raise NotLoggedIn('signed out')
+        return 'ok'
+
+    @require_login
+    def always_stale(client):
+        raise NotLoggedIn('signed out')
+
+    assert stale_once(default_client) == 'ok'
+    assert default_client.logged_in.call_count == 2
+    with pytest.raises(LoginUnsuccessful):
+        always_stale(default_client)
+
+
+def test_sqlite_store_migrates_json(tmp_path, problems):
+    filename = str(tmp_path / '.problems')
+    with open(filename, 'wt') as f:
+        json.dump(problems, f)
+
+    store = SQLiteProblemStore(filename)
+    assert store.load() == problems
+    assert os.path.exists(f'{filename}.json.bak')
+    assert SQLiteProblemStore(filename).get(4) == problems[3]
+
+
+def test_sqlite_store_upserts_rows(tmp_path, problems, solved_problem_4):
+    filename = str(tmp_path / '.problems')
+    SQLiteProblemStore(filename).upsert(problems[:10])
+
+    # two processes writing different fields of the same problem don't clobber each other
+    one, other = SQLiteProblemStore(filename), SQLiteProblemStore(filename)
+    one.upsert([solved_problem_4])
+    other.upsert([{'ID': 4, 'Solved': True}])
+
+    problem = SQLiteProblemStore(filename).get(4)
+    assert problem['code'] == solved_problem_4['code']
+    assert problem['Solved'] is True
+    assert problem['Description / Title'] == 'Largest palindrome product'
+    assert len(SQLiteProblemStore(filename).load()) == 10
+
+
+def test_store_queries_agree(tmp_path, problems, solved_problem_4):
+    import sqlite3
+
+    # a version 1 database gets its index columns filled in when it is opened
+    filename = str(tmp_path / '.problems')
+    connection = sqlite3.connect(filename)
+    connection.executescript('CREATE TABLE problems (id INTEGER PRIMARY KEY, solved INTEGER, data TEXT NOT NULL);'
+                             'PRAGMA user_version = 1;')
+    connection.executemany('INSERT INTO problems VALUES (?, ?, ?)',
+                           [(_['ID'], bool(_.get('Solved')), json.dumps(_)) for _ in problems])
+    connection.commit()
+    connection.close()
+
+    stores = [SQLiteProblemStore(filename), JSONProblemStore(str(tmp_path / '.problems.json'))]
+    stores[1].upsert(problems)
+    for store in stores:
+        store.upsert([solved_problem_4, {'ID': 9, 'Solved': True, 'code': {'c': {}, 'python3': {}}}])
+
+    queries = [{}, {'solved': True}, {'solved': False, 'ids': range(100, 201)}, {'ids': [1, 5, 9, 300]},
+               {'min_solved_by': 100000, 'max_solved_by': 300000, 'sort': 'solved-by', 'reverse': True},
+               {'language': 'python3'}, {'sort': 'title'}]
+    for query in queries:
+        sqlite, json_ = [list(_.query(**query, full=False)) for _ in stores]
+        assert sqlite == json_, query
+        assert [_['ID'] for _ in stores[0].query(**query)] == [_['ID'] for _ in sqlite]
+    assert [_['ID'] for _ in stores[0].query(solved=True)] == [9]
+    assert next(stores[0].query(language='c', full=False))['languages'] == ['c', 'python3']
+
+
+def test_search_index_is_incremental_and_ranked(runner, default_session, tmp_path):
+    from ieuler.search import SearchIndex
+
+    index = SearchIndex(str(tmp_path / '.search-index'))
+    problems = [{'ID': 44, 'Description / Title': 'Pentagon numbers',
+                 'Problem': '<p>Pentagonal numbers are generated by the formula, P<sub>n</sub>=n(3n&minus;1)/2.</p>'},
+                {'ID': 45, 'Description / Title': 'Triangular, pentagonal, and hexagonal',
+                 'Problem': '<p>Triangle, pentagonal, and hexagonal numbers are generated by the following.</p>'},
+                {'ID': 1, 'Description / Title': 'Multiples of 3 and 5', 'Problem': '<p>Find the sum.</p>'}]
+    assert index.update(problems) == 3
+    # nothing changed, so no write lock is needed: another process holding it doesn't hold this up
+    import sqlite3
+    writer = sqlite3.connect(index.filename, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    assert index.update(problems) == 0
+    writer.execute('ROLLBACK')
+    assert [_['ID'] for _ in index.search('pentagonal numbers')] == [44, 45]
+    assert '[Pentagonal]' in index.search('pentagonal')[0]['snippet']
+    assert index.search('"; DROP TABLE search') == [] and index.search('!!') == []
+
+    assert index.update([dict(problems[2], Problem='<p>Every pentagonal sum.</p>')]) == 1
+    assert [_['ID'] for _ in index.search('pentagonal sum')] == [1]
+
+    # the client indexes problems as they are stored, titles from the archive and statements from problem pages
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems([dict(problems[0], ID=44)])
+    result = runner.invoke(ilr, ['search', 'pentagon'], obj=default_session)
+    assert result.output.split()[:3] == ['44', 'Pentagon', 'numbers'] and '[Pentagonal]' in result.output
+    assert '141  Moving Pentagon' not in result.output and '  Moving Pentagon' in result.output
+    assert 'No problems match' in runner.invoke(ilr, ['search', 'zzyzx'], obj=default_session).output
+
+
+def test_sqlite_store_upgrades_once_across_processes(tmp_path, problems):
+    import sqlite3
+
+    root = os.path.dirname(os.path.dirname(__file__))
+    script = ('import sys; from ieuler.storage import SQLiteProblemStore; '
+              'store = SQLiteProblemStore(sys.argv[1]); store.upsert([{"ID": int(sys.argv[2]), "Solved": True}]); '
+              'print(store.count())')
+    for i in range(5):
+        filename = str(tmp_path / f'.problems-{i}')
+        if i % 2:  # a version 1 store with problems in it, or a new one
+            connection = sqlite3.connect(filename)
+            connection.executescript('CREATE TABLE problems (id INTEGER PRIMARY KEY, solved INTEGER, '
+                                     'data TEXT NOT NULL); PRAGMA user_version = 1;')
+            connection.executemany('INSERT INTO problems VALUES (?, 0, ?)',
+                                   [(_['ID'], json.dumps(_)) for _ in problems[:50]])
+            connection.commit()
+            connection.close()
+        processes = [subprocess.Popen([sys.executable, '-c', script, filename, str(_)], cwd=root,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE) for _ in range(1, 5)]
+        for process in processes:
+            out, err = process.communicate(timeout=60)
+            assert process.returncode == 0, err.decode()
+
+        store = SQLiteProblemStore(filename)
+        assert store.connection.execute('PRAGMA user_version').fetchone()[0] == SQLiteProblemStore.SCHEMA_VERSION
+        assert [_['ID'] for _ in store.query(solved=True)] == [1, 2, 3, 4]
+        assert store.count() == (50 if i % 2 else 4)
+
+
+def test_search_without_fts5(runner, default_session, monkeypatch):
+    from ieuler.search import SearchIndex
+
+    # as on a python whose SQLite lacks FTS5: storing problems still works, search says why it can't
+    monkeypatch.setattr(SearchIndex, 'TOKENIZE', 'missing')
+    with pytest.warns(UserWarning, match='search index was not updated'):
+        result = runner.invoke(fetch, obj=default_session, catch_exceptions=False)
+    assert result.exit_code == 0 and default_session.client.store.count() == len(default_session.client.problems)
+    assert 'Search needs SQLite built with FTS5' in runner.invoke(ilr, ['search', 'pentagon'],
+                                                                   obj=default_session).output
+
+
+def test_ls_table(runner, default_session):
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems([{'ID': 20, 'Solved': True, 'code': {'python3': {}}}])
+    result = runner.invoke(ilr, ['ls', '--table', '--solved', '-id-range', '10-30'], obj=default_session)
+    lines = result.output.rstrip().splitlines()
+    assert lines[0].split() == ['ID', 'Solved', 'Solved', 'By', 'Code', 'Title']
+    assert lines[1].split()[:4] == ['20', 'yes', '192443', 'python3'] and len(lines) == 2
+
+
+def test_cli_imports_lazily():
+    modules = {'requests', 'requests_html', 'PIL', 'numpy', 'multiprocessing.connection', 'ctypes'}
+    code = f'import sys, ieuler.cli; print(sorted({modules!r} & set(sys.modules)))'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert json.loads(result.stdout.decode().replace("'", '"')) == []
+
+
+def test_timings(runner, default_session):
+    result = runner.invoke(ilr, ['--timings', 'config'], obj=default_session)
+    assert 'total (since import)' in result.output
+
+    # the clock starts before the cli's own imports (click included), so the import phase covers them
+    code = 'import sys, ieuler; print(sorted({"click", "ieuler.cli"} & set(sys.modules)))'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert result.stdout.decode().strip() == '[]'
+
+
+def test_sync_problems_reads_only_new_pages(default_client, problems, solved_problem_4):
+    default_client.update_problems(problems[:60])
+    default_client.update_problems([solved_problem_4])
+
+    def get_problem_list_on_page(page):
+        return [dict(_, **{'Solved By': '1'}) for _ in problems[(page - 1) * 50:page * 50]]
+
+    def get_problem_details(number):
+        return {'ID': number, 'Problem': f'<p>{number}</p>', 'problem_url': problems[number - 1]['problem_url']}
+
+    default_client.get_page_qty = MagicMock(return_value=3)
+    default_client.get_problem_list_on_page = MagicMock(side_effect=get_problem_list_on_page)
+    default_client.get_problem_details = MagicMock(side_effect=get_problem_details)
+
+    new_problems = default_client.sync_problems(concurrency=4)
+    assert [_['ID'] for _ in new_problems] == list(range(61, 151))
+    assert sorted(_[1]['page'] for _ in default_client.get_problem_list_on_page.call_args_list) == [2, 3]
+    assert default_client.get_problem_details.call_count == 90
+
+    stored = default_client.store.load()
+    assert [_['ID'] for _ in stored] == list(range(1, 151))
+    assert stored[3]['code'] == solved_problem_4['code']
+    assert stored[59]['Solved By'] == '1'
+    assert stored[149]['Problem'] == '<p>150</p>'
+
+    # nothing new: just the first and last archive pages
+    default_client.get_problem_list_on_page.reset_mock()
+    assert default_client.sync_problems() == []
+    assert [_[1]['page'] for _ in default_client.get_problem_list_on_page.call_args_list] == [3]
+
+
+def test_parse_range():
+    assert parse_range('1-3,7, 5') == [1, 2, 3, 5, 7]
+    assert parse_range('10') == [10]
+    for bad in ('0', '0-3', '-3', 'x'):
+        with pytest.raises(click.BadParameter):
+            parse_range(bad)
+
+
+def test_prefetch(runner, default_session, problems):
+    def get_problem_details(number):
+        return {'ID': number, 'Problem': f'<p>{number}</p>'}
+
+    default_session.client.get_problem_details = MagicMock(side_effect=get_problem_details)
+    default_session.client.update_problems = MagicMock(wraps=default_session.client.update_problems)
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems.reset_mock()
+
+    result = runner.invoke(ilr, ['prefetch', '1-20', '-rate', '0'], obj=default_session)
+    assert 'Fetched 20 problem(s), 0 already stored.' in result.output
+    assert default_session.client.update_problems.call_count == 1  # one batch write
+    assert default_session.client.store.get(20)['Problem'] == '<p>20</p>'
+
+    result = runner.invoke(ilr, ['prefetch', '15-25', '-rate', '0'], obj=default_session)
+    assert 'Fetched 5 problem(s), 6 already stored.' in result.output
+
+    # a failure keeps what was fetched and says which problems to retry
+    def get_problem_details(number):
+        if number in (30, 31):
+            raise requests.exceptions.ConnectionError(f'no route to problem {number}')
+        return {'ID': number, 'Problem': f'<p>{number}</p>'}
+
+    default_session.client.get_problem_details.side_effect = get_problem_details
+    result = runner.invoke(ilr, ['prefetch', '26-35', '-rate', '0'], obj=default_session)
+    assert result.exit_code == 0 and 'Fetched 8 problem(s)' in result.output
+    assert 'Could not fetch 2 problem(s)' in result.output and '  31: ConnectionError: no route to problem 31' in result.output
+    assert default_session.client.store.get(35)['Problem'] == '<p>35</p>' and 'Problem' not in default_session.client.store.get(30)
+
+
+def test_mirror_assets(default_client, tmp_path):
+    default_client.asset_mirror = AssetMirror(str(tmp_path / '.assets'))
+    names = 'https://projecteuler.net/project/resources/p022_names.txt'
+    problems = [{'ID': 1, 'Problem': '<p>Nothing to see here</p>'},
+                {'ID': 2, 'Problem': f'<p><a href="{names}">names</a></p>'},
+                {'ID': 3, 'Problem': f'<p><a href="{names.replace(".net", ".com")}">names</a></p>'}]
+    default_client.update_problems(problems)
+
+    contents = {names: b'"MARY","PATRICIA"', names.replace('.net', '.com'): b'"MARY","PATRICIA"'}
+    default_client._session = MagicMock()
+    default_client.session.get = MagicMock(side_effect=lambda url: _response(url, content=contents[url]))
+
+    updates = default_client.mirror_assets(default_client.problems, rate=0)
+    assert [_['ID'] for _ in updates] == [2, 3]
+    path = updates[0]['assets'][names]
+    assert f'href="{path}"' in default_client.store.get(2)['Problem']
+    assert len(set(updates[0]['assets'].values()) | set(updates[1]['assets'].values())) == 1  # same content, one copy
+
+    with open_asset('p022_names.txt', dirname=default_client.asset_mirror.dirname) as f:
+        assert f.read() == '"MARY","PATRICIA"'
+
+    # mirroring again doesn't download anything
+    default_client.session.get.reset_mock()
+    default_client.mirror_assets(default_client.problems, rate=0)
+    assert default_client.session.get.call_count == 0
+
+
+def test_mirror_assets_ignores_query_strings(tmp_path):
+    mirror = AssetMirror(str(tmp_path / '.assets'))
+    url = 'https://projecteuler.net/project/images/p015.png?1678992052#grid'
+    assert find_asset_urls(f'<img src="{url}">') == [url]
+    path = mirror.add(url, b'png')
+    assert path.endswith('.png')
+    mirror.update_index({url: path})
+    assert mirror.find('p015.png') == path
+
+
+def test_unsubmit(runner, default_session):
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems([{'ID': 10, 'code': {
+        'python3': {'filename': '10.py', 'filecontent': 'print(0)\n', 'submission': '0'},
+        'c': {'filename': '10.c', 'filecontent': '', 'submission': '1'}}}])
+
+    result = runner.invoke(ilr, ['submit', '10'], obj=default_session)
+    assert 'ilr unsubmit 10' in result.output
+    assert 'in python3' in runner.invoke(ilr, ['unsubmit', '-language', 'python3', '10'], obj=default_session).output
+    code = default_session.client.store.get(10)['code']
+    assert code['python3']['submission'] is None and code['c']['submission'] == '1'
+    runner.invoke(ilr, ['unsubmit', '10'], obj=default_session)
+    assert 'no submission' in runner.invoke(ilr, ['unsubmit', '10'], obj=default_session).output
+
+
+def test_bench(runner, default_session, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems([
+        {'ID': 1, 'correct_answer': '233168',
+         'code': {'python3': {'filename': '1.py', 'filecontent': 'print(233168)\n', 'submission': None}}},
+        {'ID': 2, 'correct_answer': '4613732',
+         'code': {'python3': {'filename': '2.py', 'filecontent': 'print(0)\n', 'submission': None}}},
+        {'ID': 3, 'code': {'python3': {'filename': '3.py', 'filecontent': 'raise SystemExit(1)\n', 'submission': None}}},
+    ])
+
+    result = runner.invoke(ilr, ['bench', '1-4', '-json', 'bench.json'], obj=default_session)
+    assert result.exit_code == 0
+    with open('bench.json', 'rt') as f:
+        rows = json.load(f)
+    assert [(_['ID'], _['status']) for _ in rows] == [(1, 'correct'), (2, 'wrong'), (3, 'error'), (4, 'unknown')]
+    assert all(_['wall_time'] > 0 and _['max_rss'] > 0 for _ in rows)
+
+    # 0 is not a problem, rather than the last one
+    result = runner.invoke(ilr, ['bench', '0'], obj=default_session)
+    assert result.exit_code == 2 and 'numbered from 1' in result.output
+
+
+def test_run_limits_and_streaming():
+    lines = []
+    result = run([sys.executable, '-c', 'print(1); print(2)'], on_stdout=lines.append)
+    assert lines == [b'1\n', b'2\n'] and result.answer == '1\n2' and result.exit_reason == 'ok'
+
+    result = run([sys.executable, '-c', 'while True: pass'], limits=Limits(cpu=1), timeout=10)
+    assert result.exit_reason == 'cpu-limit' and result.cpu_time > 0.5
+
+    result = run([sys.executable, '-c', 'x = bytearray(2 ** 30)'], limits=Limits(memory=2 ** 28))
+    assert result.exit_reason == 'memory-limit'
+
+    result = run([sys.executable, '-c', 'import time; time.sleep(10)'], timeout=0.2)
+    assert result.exit_reason == 'timeout' and result.wall_time < 5
+
+    # limits from many threads at once, as bench and submit --queue run solutions
+    from concurrent.futures import ThreadPoolExecutor
+    code = 'import resource, time; time.sleep(0.2); print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])'
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda n: run([sys.executable, '-c', code], limits=Limits(open_files=64 + n)),
+                                    range(16)))
+    assert [_.answer for _ in results] == [str(64 + n) for n in range(16)]
+
+
+def test_submit_dry_stores_run(runner, default_session, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    runner.invoke(fetch, obj=default_session)
+
+    result = runner.invoke(ilr, ['submit', '--dry', '4'], obj=default_session)
+    assert "Result of executing: ['python3', '4.py']: 0" in result.output
+    last_run = default_session.client.store.get(4)['last_run']['python3']
+    assert last_run['exit_reason'] == 'ok' and last_run['wall_time'] > 0
+    # how a run went on this machine isn't sent to the ieuler-server
+    from ieuler.sync import sync_payload
+    assert 'last_run' not in json.dumps(sync_payload(default_session.client.store.get(4)))
+
+
+@pytest.mark.parametrize('filename', ['trace.json', 'trace.jsonl'])
+def test_trace(runner, default_session, monkeypatch, tmp_path, filename):
+    monkeypatch.chdir(tmp_path)
+    runner.invoke(fetch, obj=default_session)
+    assert tracing.span('off') is tracing.NO_SPAN
+
+    result = runner.invoke(ilr, ['--trace', filename, 'submit', '--dry', '4'], obj=default_session)
+    assert result.exit_code == 0 and not tracing.enabled()
+    with open(filename, 'rt') as f:
+        events = json.load(f)['traceEvents'] if filename.endswith('.json') else [json.loads(_) for _ in f]
+    spans = {_['name']: _ for _ in events}
+    assert {'ilr submit', 'run solution', 'store upsert'} <= set(spans)
+    assert spans['run solution']['args']['exit_reason'] == 'ok' and spans['store upsert']['args']['rows'] == 1
+    root = spans['ilr submit']
+    assert all(root['ts'] <= _['ts'] and _['ts'] + _['dur'] <= root['ts'] + root['dur'] + 1 for _ in events)
+
+
+def test_submit_shows_a_failed_run_once(runner, default_session, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    runner.invoke(fetch, obj=default_session)
+    default_session.client.update_problems([{'ID': 5, 'code': {'python3': {
+        'filename': '5.py', 'filecontent': 'raise ValueError("nope")\n', 'submission': None}}}])
+
+    result = runner.invoke(ilr, ['submit', '--dry', '--cold', '5'], obj=default_session)
+    assert result.output.count('ValueError: nope') == 1 and 'error running the file: error.' in result.output
+
+
+def test_forkserver(tmp_path):
+    address = str(tmp_path / '.runner.sock')
+    server = subprocess.Popen([sys.executable, '-m', 'ieuler.forkserver', address, 'json'],
+                              cwd=os.path.dirname(os.path.dirname(__file__)))
+    try:
+        for _ in range(200):
+            if forkserver.available(address):
+                break
+            time.sleep(0.05)
+        assert forkserver.status(address)['preload'] == ['json']
+
+        (tmp_path / '1.py').write_text('import json\nprint(hasattr(json, "leak"))\njson.leak = True\n')
+        lines = []
+        for _ in range(2):  # every run starts from the same clean state
+            result = forkserver.run('1.py', cwd=str(tmp_path), on_stdout=lines.append, address=address)
+            assert result.exit_reason == 'ok' and result.answer == 'False'
+        assert lines == [b'False\n', b'False\n']
+
+        (tmp_path / '2.py').write_text('raise ValueError("nope")\n')
+        result = forkserver.run('2.py', cwd=str(tmp_path), address=address)
+        assert result.exit_reason == 'error' and b'ValueError: nope' in result.stderr
+
+        (tmp_path / '3.py').write_text('import time\ntime.sleep(10)\n')
+        result = forkserver.run('3.py', cwd=str(tmp_path), timeout=0.2, address=address)
+        assert result.exit_reason == 'timeout'
+
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        result = forkserver.run('3.py', cwd=str(tmp_path), cancel=cancel, address=address)
+        assert result.exit_reason == 'cancelled'
+    finally:
+        forkserver.stop(address)
+        server.wait(timeout=10)
+
+
+@pytest.mark.parametrize('language', ['c', 'cpp', 'rust', 'go'])
+def test_compiled_templates(language, tmp_path, monkeypatch):
+    template = get_template(language)
+    if not shutil.which(template.compiler):
+        pytest.skip(f'{template.compiler} is not installed')
+    monkeypatch.chdir(tmp_path)
+    filename = f'1{template.extension}'
+    with open(filename, 'wt') as f:
+        f.write(template.template('{"ID": 1}'))
+
+    result = run_solution(language, filename)
+    assert result.exit_reason == 'ok' and result.answer == '0'
+
+    # the same source is never built twice
+    monkeypatch.setattr('ieuler.build.subprocess.run', MagicMock(side_effect=AssertionError('rebuilt')))
+    assert run_solution(language, filename, reuse=False).answer == '0'
+
+
+def test_build_error(tmp_path, monkeypatch):
+    if not shutil.which('cc'):
+        pytest.skip('cc is not installed')
+    monkeypatch.chdir(tmp_path)
+    with open('1.c', 'wt') as f:
+        f.write('int main(void) { return nope; }\n')
+    result = run_solution('c', '1.c')
+    assert result.exit_reason == 'build-error' and b'nope' in result.stderr
+
+
+def test_submit_dry_reuses_results(runner, default_session, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    runner.invoke(fetch, obj=default_session)
+
+    assert '(cached)' not in runner.invoke(ilr, ['submit', '--dry', '4'], obj=default_session).output
+    result = runner.invoke(ilr, ['submit', '--dry', '4'], obj=default_session)
+    assert 'ok (' in result.output and 'cached)' in result.output
+    assert "Result of executing: ['python3', '4.py']: 0" in result.output
+    assert 'cached)' not in runner.invoke(ilr, ['submit', '--dry', '--rerun', '4'], obj=default_session).output
+
+    with open('4.py', 'at') as f:
+        f.write('print("changed")\n')
+    assert 'cached)' not in runner.invoke(ilr, ['submit', '--dry', '4'], obj=default_session).output
+
+
+def test_run_cancel():
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    result = run([sys.executable, '-c', 'import time; time.sleep(10)'], cancel=cancel)
+    assert result.exit_reason == 'cancelled' and result.wall_time < 5
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watch_file_debounces(use_inotify, tmp_path):
+    path = tmp_path / '1.py'
+    path.write_text('print(0)\n')
+    changes, stop = [], threading.Event()
+
+    def on_change():
+        changes.append(path.read_text())
+
+    watcher = threading.Thread(target=watch_file, args=(str(path), on_change),
+                               kwargs={'debounce': 0.3, 'poll_interval': 0.05, 'stop': stop,
+                                       'use_inotify': use_inotify})
+    watcher.start()
+    try:
+        time.sleep(0.2)
+        for i in range(1, 4):  # a burst of saves is one change
+            path.write_text(f'print({i})\n')
+            time.sleep(0.05)
+        for _ in range(40):
+            if changes:
+                break
+            time.sleep(0.05)
+        time.sleep(0.4)
+        assert changes == ['print(3)\n']
+    finally:
+        stop.set()
+        watcher.join()
+
+
+def test_show_image_matches_palette_and_merges_runs():
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    from ieuler.terminal_image_viewer import get_ansi_color_code, get_ansi_color_codes, show_image
+
+    pixels = np.random.RandomState(0).randint(0, 256, (7, 9, 3), dtype=np.uint8)
+    pixels[0, :3] = [[5, 5, 5], [100, 100, 100], [250, 250, 250]]
+    codes = get_ansi_color_codes(pixels)
+    assert codes.tolist() == [[get_ansi_color_code(*(int(_) for _ in pixel)) for pixel in row] for row in pixels]
+
+    out = io.StringIO()
+    show_image(Image.fromarray(pixels), width=80, file=out)
+    assert out.getvalue().count('\n') == 4 and out.getvalue().count('▀') == 4 * 9
+
+    out = io.StringIO()
+    show_image(Image.new('RGB', (200, 40), (255, 0, 0)), width=100, file=out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 10 and all(_.count('\x1b[') == 2 and _.count('▀') == 100 for _ in lines)
+
+
+def test_login_prefetches_sign_in_form_and_captcha(default_client, monkeypatch):
+    requested = []
+
+    def get(url, **kwargs):
+        requested.append(url.split('?')[0])
+        time.sleep(0.1)
+        r = MagicMock(content=b'captcha')
+        r.html.find.return_value.attrs = {'value': 'token'}
+        return r
+
+    session = MagicMock()
+    session.get.side_effect = get
+    session.cookies.get_dict.return_value = {'PHPSESSID': 'abc'}
+    session.post.return_value = MagicMock(url='https://projecteuler.net/archives')
+    default_client._session = session
+
+    in_flight_at_prompt = []
+
+    def confirm(*args, **kwargs):
+        time.sleep(0.02)  # the user reading the prompt
+        in_flight_at_prompt.extend(requested)
+
+    monkeypatch.setattr('click.confirm', confirm)
+
+    class Captcha(object):
+        def __init__(self, captcha_bytes):
+            assert captcha_bytes == b'captcha'
+            self.input = '12345'
+
+        def show_in_terminal(self):
+            pass
+
+    monkeypatch.setattr('ieuler.client.Captcha', Captcha)
+    start = time.perf_counter()
+    default_client.login('euler', 'secret')
+    assert time.perf_counter() - start < 0.2  # both requests went out together, ahead of the prompt
+    assert sorted(in_flight_at_prompt) == ['https://projecteuler.net/captcha/show_captcha.php',
+                                           'https://projecteuler.net/sign_in']
+    assert session.get.call_count == 2
+    data = session.post.call_args[1]['data']
+    assert data['csrf_token'] == 'token' and data['captcha'] == '12345'
+
+
+def test_submit_queue_runs_then_drains_and_resumes(runner, default_session, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('IEULER_SUBMIT_RATE', '0')
+    runner.invoke(fetch, obj=default_session)
+    client = default_session.client
+    client.update_problems([{'ID': n, 'Solved': False, 'code': {'python3': {
+        'filename': f'{n}.py', 'filecontent': f'print({n * 10})\n', 'submission': None}}} for n in (1, 2, 3)])
+    client.update_problems([{'ID': 4, 'Solved': True}])
+    monkeypatch.setattr('ieuler.cli.send', MagicMock())
+
+    answered, signed_out = [], [True]
+
+    def submit(number, answer):
+        if number == 2 and signed_out:
+            signed_out.pop()
+            raise LoginUnsuccessful('signed out')
+        answered.append(number)
+        return {'correct_answer': answer, 'completed_on': 'now', 'Solved': True}
+
+    client.submit = MagicMock(side_effect=submit)
+    result = runner.invoke(ilr, ['submit', '--queue', '1-4'], obj=default_session)
+    assert '4: already solved.' in result.output and 'still queued' in result.output
+    assert [_['ID'] for _ in SubmissionQueue().load()] == [2, 3]  # 1 was answered before the interruption
+
+    result = runner.invoke(ilr, ['submit', '--queue'], obj=default_session)
+    assert '3: 30 is correct.' in result.output
+    assert answered == [1, 2, 3] and SubmissionQueue().load() == []
+    assert client.store.get(2)['code']['python3']['submission'] == '20'
+
+    # a queue written against a bigger store
+    SubmissionQueue().put([{'ID': 9999, 'language': 'python3', 'answer': '1'}])
+    result = runner.invoke(ilr, ['submit', '--queue'], obj=default_session)
+    assert result.exit_code == 0 and '9999: not a stored problem' in result.output
+    assert SubmissionQueue().load() == [] and answered == [1, 2, 3]
+
+    # -rate 0 means no limit, not the default
+    from ieuler.client import RateLimiter
+    monkeypatch.setenv('IEULER_SUBMIT_RATE', '0.001')
+    limiter = MagicMock(wraps=RateLimiter)
+    monkeypatch.setattr('ieuler.cli.RateLimiter', limiter)
+    client.update_problems([{'ID': 5, 'code': {'python3': {'filename': '5.py', 'filecontent': '', 'submission': None}}}])
+    SubmissionQueue().put([{'ID': 5, 'language': 'python3', 'answer': '1'}])
+    result = runner.invoke(ilr, ['submit', '--queue', '-rate', '0'], obj=default_session)
+    limiter.assert_called_once_with(0.0)
+    assert result.exit_code == 0, result.output
+    assert answered == [1, 2, 3, 5]
+
+
+def test_ieuler_server_calls_share_a_connection_and_retry(default_client, monkeypatch):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    seen = {'ports': set(), 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            seen['ports'].add(self.client_address[1])
+            seen['requests'] += 1
+            status, body = (503, b'busy') if seen['requests'] == 2 else (200, b'[]')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_POST = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        default_client.set_server_config('127.0.0.1', server.server_address[1])
+        default_client.dump_credentials({'username': 'euler', 'password': 'secret'})
+        default_client.dump_cookies({'PHPSESSID': 'abc'})
+        monkeypatch.setattr(Client, 'SERVER_BACKOFF', 0.01)
+
+        Client.ping_ipe(default_client)  # the fixture stubs these two out
+        assert Client.get_from_ipe(default_client) == []  # the 503 was retried
+        assert default_client.send_to_ipe([]) == []
+        assert seen['requests'] == 4 and len(seen['ports']) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_sync_sends_and_pulls_only_changes(default_client, monkeypatch):
+    import gzip
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    posts, gets = [], []
+    remote = [{'ID': 2, 'code': {'python3': {'filecontent': 'print(2)\n'}}, 'Solved': None, 'completed_on': None,
+               'correct_answer': None},
+              {'ID': 5, 'code': {'python3': {'filecontent': 'print(5)\n'}}, 'Solved': True, 'completed_on': 'then',
+               'correct_answer': '5'}]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def reply(self, body, **headers):
+            body = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('X-Ieuler-Sync', '1')
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            gets.append(parse_qs(urlparse(self.path).query))
+            self.reply(remote, **{'X-Ieuler-Cursor': 'c1'})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            gzipped = self.headers.get('Content-Encoding') == 'gzip'
+            posts.append((gzipped, [_['ID'] for _ in json.loads(gzip.decompress(body) if gzipped else body)]))
+            self.reply({'ok': True})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        default_client.set_server_config('127.0.0.1', server.server_address[1])
+        default_client.dump_credentials({'username': 'euler', 'password': 'secret'})
+        default_client.dump_cookies({'PHPSESSID': 'abc'})
+        monkeypatch.setattr(Client, 'SYNC_BATCH_SIZE', 2)
+        problems = [{'ID': n, 'Description / Title': f'{n}', 'code': {'python3': {'filecontent': f'print({n})\n'}}}
+                    for n in (1, 2, 3, 4)]
+        problems[3].pop('code')
+        default_client.problems = problems
+
+        default_client.sync_to_ipe(problems)
+        assert posts == [(False, [1, 2]), (True, [3])]  # gzip once the server said it speaks the protocol
+        assert default_client.sync_to_ipe(problems) == []
+        problems[0]['code']['python3']['filecontent'] = 'print("changed")\n'
+        default_client.sync_to_ipe(problems)
+        assert posts[2:] == [(True, [1])]
+
+        pulled = Client.get_from_ipe(default_client)  # the fixture stubs it out
+        assert [_['ID'] for _ in pulled] == [5]  # 2 is what we already have
+        default_client.update_problems(pulled)
+        default_client.ack_pulled(pulled)
+        Client.get_from_ipe(default_client)
+        assert gets == [{}, {'since': ['c1']}]
+        assert default_client.sync_to_ipe(default_client.problems) == []  # nor is what we pulled sent back
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize('sync', [True, False])
+def test_send_and_fetch_against_stand_in_server(sync, runner, tmp_path):
+    from ieuler.cli import Session
+    from ieuler.devserver import StandInServer
+
+    cookies = {'PHPSESSID': 'abc'}
+    with StandInServer(users={'euler': cookies}, sync=sync) as stand_in:
+        sessions = []
+        for name in ('here', 'there'):
+            session = Session(**{f'{_}_filename': str(tmp_path / f'{name}.{_}')
+                                 for _ in ('cookies', 'credentials', 'problems', 'default_language', 'login_state',
+                                           'sync_state')})
+            client = session.client
+            client.set_server_config(stand_in.host, stand_in.port)
+            client.dump_credentials({'username': 'euler', 'password': 'secret'})
+            client.dump_cookies(cookies)
+            client.logged_in = MagicMock(return_value=True)
+            client.store.upsert([{'ID': n, 'Description / Title': f'{n}'} for n in range(1, 6)])
+            sessions.append(session)
+        here, there = sessions
+
+        here.client.update_problems([{'ID': n, 'code': {'python3': {'filecontent': f'print({n})\n'}}}
+                                     for n in (1, 2, 3)])
+        assert "'changed': 3" in runner.invoke(ilr, ['send'], obj=here).output.replace('"', "'")
+        assert 'Nothing changed' in runner.invoke(ilr, ['send'], obj=here).output
+        here.client.update_problems([{'ID': 2, 'code': {'python3': {'filecontent': 'print("two")\n'}}}])
+        stand_in.reset_stats()
+        assert "'received': 1" in runner.invoke(ilr, ['send'], obj=here).output.replace('"', "'")
+        # counted by the time the client has the response
+        assert stand_in.stats['requests'] == 1 and stand_in.stats['bytes_in'] > 0 and stand_in.stats['bytes_out'] > 0
+
+        runner.invoke(ilr, ['fetch', '--skip-pe-update'], obj=there)
+        assert there.client.store.get(2)['code']['python3']['filecontent'] == 'print("two")\n'
+        assert there.client.sync_state().cursor == ('4' if sync else None)
+
+        there.client.dump_cookies({'PHPSESSID': 'someone else'})
+        with pytest.raises(LoginUnsuccessful):
+            Client.get_from_ipe(there.client)
+
+
+def test_parsing_matches_requests_html():
+    from ieuler.parsing import parse_archive_page, parse_page_qty, parse_problem_page
+
+    fixtures = os.path.join(os.path.dirname(__file__), 'fixtures')
+    with open(os.path.join(fixtures, 'parsed.json'), 'rt') as f:
+        parsed = json.load(f)  # what the requests_html element wrappers made of the same pages
+    with open(os.path.join(fixtures, 'archives.html'), 'rb') as f:
+        archives = f.read()
+    with open(os.path.join(fixtures, 'problem.html'), 'rb') as f:
+        problem = f.read()
+
+    assert parse_archive_page(archives, 'https://projecteuler.net/archives;page=2') == parsed['rows']
+    assert parse_page_qty(archives) == parsed['page_qty']
+    assert parse_problem_page(problem) == (parsed['title'], parsed['problem_content'])
+
+    # text after the statement's closing tag isn't part of it
+    page = b'<h2>Multiples of 3 or 5</h2><div class="problem_content"><p>Find the sum.</p></div>\nShare'
+    assert parse_problem_page(page) == ('Multiples of 3 or 5', '<div class="problem_content"><p>Find the sum.</p></div>')
+
+
+def test_benchmark_suite_emits_json():
+    root = os.path.dirname(os.path.dirname(__file__))
+    r = subprocess.run([sys.executable, os.path.join(root, 'benchmarks', 'suite.py'), '-filter', 'solution_template',
+                        '-repeat', '2', '-number', '10', '-json', '-'], capture_output=True, check=True)
+    results = json.loads(r.stdout)
+    assert {_['params']['language'] for _ in results['results']} >= {'python3', 'c', 'go'}
+    assert all(_['best_s'] > 0 for _ in results['results']) and results['meta']['python']